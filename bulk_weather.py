@@ -0,0 +1,229 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from config import load_config
+from municipalities import MUNICIPIOS_FILE, open_registry
+from weather import AemetClient
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Directorio y fichero de la tabla de veredictos de todos los municipios
+WEATHER_DIR = "data/weather"
+VERDICTS_FILE = "veredictos.npz"
+
+# Bloques horarios de la predicción, en el orden de las columnas de la tabla
+BLOQUES = ["00-06", "06-12", "12-18", "18-24"]
+
+# Veredictos de la tabla
+BUENO, MALO, DESCONOCIDO = 0, 1, -1
+
+# Municipios que se descargan a la vez (la cuota de AEMET es el límite real)
+HILOS = 4
+
+# Intentos por municipio cuando el cortocircuito está abierto
+REINTENTOS = 3
+
+
+def extraer_bloques(datos, fecha, bloques=BLOQUES):
+    """
+    Extrae la probabilidad de lluvia y la velocidad del viento de cada bloque horario de un día.
+    Args:
+        datos (list): Predicción diaria de AEMET en JSON.
+        fecha (str): Día a extraer (AAAA-MM-DD).
+        bloques (list): Bloques horarios.
+    Returns:
+        tuple: (lluvia, viento) como arrays float32 con NaN donde falta el dato,
+               o None si la predicción no incluye ese día.
+    """
+    dias = datos[0]['prediccion']['dia']
+    dia = next((d for d in dias if str(d.get('fecha', '')).startswith(fecha)), None)
+    if dia is None:
+        return None
+    columnas = {bloque: i for i, bloque in enumerate(bloques)}
+    lluvia = np.full(len(bloques), np.nan, dtype=np.float32)
+    viento = np.full(len(bloques), np.nan, dtype=np.float32)
+    for destino, clave, valor in ((lluvia, 'probPrecipitacion', 'value'), (viento, 'viento', 'velocidad')):
+        for periodo in dia.get(clave, []):
+            i = columnas.get(periodo.get('periodo'))
+            if i is None:
+                continue
+            try:
+                destino[i] = float(periodo.get(valor))
+            except (TypeError, ValueError):
+                pass
+    return lluvia, viento
+
+
+def clasificar(lluvia, viento, umbral_lluvia=30, umbral_viento=50):
+    """
+    Aplica los umbrales de lluvia y viento a todos los municipios y bloques a la vez.
+    Como en get_weather, un dato que falta cuenta como 0; si no hay ningún dato la celda es desconocida.
+    Args:
+        lluvia (np.ndarray): Probabilidad de lluvia (%) por municipio y bloque.
+        viento (np.ndarray): Velocidad del viento (km/h) por municipio y bloque.
+        umbral_lluvia (float): Probabilidad por encima de la cual no se recomienda salir.
+        umbral_viento (float): Velocidad por encima de la cual no se recomienda salir.
+    Returns:
+        np.ndarray: Veredictos int8 (BUENO, MALO o DESCONOCIDO) con la misma forma.
+    """
+    malo = (np.nan_to_num(lluvia) > umbral_lluvia) | (np.nan_to_num(viento) > umbral_viento)
+    veredictos = malo.astype(np.int8)
+    veredictos[np.isnan(lluvia) & np.isnan(viento)] = DESCONOCIDO
+    return veredictos
+
+
+class WeatherTable:
+    """
+    Tabla de veredictos de clima de un día para todos los municipios, por bloque horario.
+    Guarda también la lluvia y el viento (float16) para poder reclasificar con otros umbrales.
+    """
+
+    def __init__(self, fecha, codigos, veredictos, lluvia, viento, obtenidas):
+        self.fecha = fecha
+        self.codigos = codigos
+        self.veredictos = veredictos
+        self.lluvia = lluvia
+        self.viento = viento
+        self.obtenidas = obtenidas
+
+    def save(self, directorio=WEATHER_DIR):
+        """Guarda la tabla en disco"""
+        os.makedirs(directorio, exist_ok=True)
+        # Se escribe en un temporal y se renombra para que la aplicación nunca lea una tabla a medias
+        temporal = os.path.join(directorio, f"tmp_{VERDICTS_FILE}")
+        np.savez(
+            temporal,
+            fecha=np.array(self.fecha),
+            codigos=self.codigos,
+            veredictos=self.veredictos,
+            lluvia=self.lluvia,
+            viento=self.viento,
+            obtenidas=self.obtenidas,
+        )
+        os.replace(temporal, os.path.join(directorio, VERDICTS_FILE))
+
+    @classmethod
+    def load(cls, directorio=WEATHER_DIR):
+        """
+        Carga la tabla desde disco.
+        Returns:
+            WeatherTable: Tabla de veredictos o None si no existe.
+        """
+        ruta = os.path.join(directorio, VERDICTS_FILE)
+        if not os.path.exists(ruta):
+            return None
+        with np.load(ruta) as datos:
+            return cls(
+                str(datos['fecha']), datos['codigos'], datos['veredictos'],
+                datos['lluvia'], datos['viento'], datos['obtenidas'],
+            )
+
+    def verdict(self, codigo, bloque, antiguedad_maxima=None):
+        """
+        Consulta el veredicto de un municipio en un bloque horario de hoy.
+        Args:
+            codigo (int): Código de AEMET del municipio.
+            bloque (str): Bloque horario, p. ej. "12-18".
+            antiguedad_maxima (float): Segundos máximos desde la descarga (None para no comprobarlo).
+        Returns:
+            str: 'good', 'bad' o None si la tabla no tiene un veredicto válido.
+        """
+        if self.fecha != datetime.now().strftime('%Y-%m-%d') or bloque not in BLOQUES:
+            return None
+        i = int(np.searchsorted(self.codigos, codigo))
+        if i == len(self.codigos) or self.codigos[i] != codigo:
+            return None
+        if antiguedad_maxima is not None and time.time() - self.obtenidas[i] > antiguedad_maxima:
+            return None
+        veredicto = self.veredictos[i, BLOQUES.index(bloque)]
+        if veredicto == DESCONOCIDO:
+            return None
+        return 'bad' if veredicto == MALO else 'good'
+
+    def summary(self):
+        """
+        Cuenta los municipios con cada veredicto por bloque horario.
+        Returns:
+            dict: {bloque: {'good': n, 'bad': n, 'unknown': n}}
+        """
+        return {
+            bloque: {
+                'good': int((self.veredictos[:, i] == BUENO).sum()),
+                'bad': int((self.veredictos[:, i] == MALO).sum()),
+                'unknown': int((self.veredictos[:, i] == DESCONOCIDO).sum()),
+            }
+            for i, bloque in enumerate(BLOQUES)
+        }
+
+
+def classify_all(cliente, registro, config=None, hilos=HILOS):
+    """
+    Descarga la predicción de todos los municipios y clasifica cada bloque horario de hoy.
+    Las descargas pasan por el cliente de AEMET (cuota, cortocircuito y peticiones agrupadas)
+    con un número acotado de hilos; cada hilo espera a la cuota en lugar de fallar.
+    Args:
+        cliente (AemetClient): Cliente de AEMET.
+        registro (MunicipalityRegistry): Municipios a clasificar.
+        config (dict): Configuración de la aplicación (sección weather).
+        hilos (int): Descargas simultáneas.
+    Returns:
+        WeatherTable: Veredictos de todos los municipios.
+    """
+    clima = (config or {}).get('weather', {})
+    fecha = datetime.now().strftime('%Y-%m-%d')
+    orden = np.argsort(registro.codigos)
+    codigos = registro.codigos[orden]
+    lluvia = np.full((len(codigos), len(BLOQUES)), np.nan, dtype=np.float32)
+    viento = np.full((len(codigos), len(BLOQUES)), np.nan, dtype=np.float32)
+    obtenidas = np.zeros(len(codigos), dtype=np.float64)
+
+    def descargar(fila):
+        municipio_id = f"{int(codigos[fila]):05d}"
+        for _ in range(REINTENTOS):
+            prediccion = cliente.fetch(municipio_id, espera_cuota=float('inf'), recordar=False)
+            if prediccion is not None:
+                break
+            if cliente.breaker.estado == 'open':
+                time.sleep(cliente.breaker.tiempo_reinicio)
+        else:
+            return
+        try:
+            bloques = extraer_bloques(prediccion.datos, fecha)
+        except (KeyError, IndexError, TypeError) as e:
+            logger.error(f"Predicción no válida para {municipio_id}: {str(e)}")
+            return
+        if bloques is not None:
+            lluvia[fila], viento[fila] = bloques
+            obtenidas[fila] = prediccion.obtenida
+
+    with ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='bulk-weather') as ejecutor:
+        for hechas, _ in enumerate(ejecutor.map(descargar, range(len(codigos))), start=1):
+            if hechas % 500 == 0:
+                logger.info(f"{hechas}/{len(codigos)} municipios descargados")
+
+    veredictos = clasificar(
+        lluvia, viento,
+        clima.get('rain_probability_threshold', 30),
+        clima.get('wind_speed_threshold', 50),
+    )
+    return WeatherTable(fecha, codigos, veredictos, lluvia.astype(np.float16), viento.astype(np.float16), obtenidas)
+
+
+if __name__ == '__main__':
+    # Clasificar todos los municipios fuera de la aplicación (AEMET_API_KEY en el entorno)
+    configuracion = load_config()
+    tabla = classify_all(
+        AemetClient.from_config(os.environ['AEMET_API_KEY'], configuracion),
+        open_registry(MUNICIPIOS_FILE),
+        configuracion,
+    )
+    tabla.save()
+    for bloque, totales in tabla.summary().items():
+        print(f"{bloque}: {totales['good']} buenos, {totales['bad']} malos, {totales['unknown']} desconocidos")
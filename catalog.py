@@ -0,0 +1,332 @@
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from snapshots import file_hash
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Directorio donde se guardan las particiones del catálogo
+PARTITIONS_DIR = "data/partitions"
+MANIFEST_FILE = "manifest.json"
+
+# Bloques de duración (minutos) usados para particionar el catálogo
+TIME_BUCKETS = [(0, 30), (30, 60), (60, 120), (120, 240), (240, None)]
+
+# Tipos de actividad en el orden en que se numeran las filas
+TIPOS = ["interior", "exterior"]
+
+# Intentos de muestreo por rechazo antes de recorrer las particiones
+MAX_INTENTOS = 32
+
+# Número máximo de filas de partición que se mantienen en memoria a la vez
+MAX_FILAS_EN_MEMORIA = 250_000
+
+# Filas por fichero dentro de cada partición: una consulta lee como mucho un trozo de este tamaño,
+# así que su coste no crece con el catálogo
+FILAS_POR_TROZO = 2_000
+
+# Versión del formato de las particiones: cambiarla si cambia cómo se escriben para reconstruirlas
+FORMATO = 2
+
+
+def normalizar_texto(texto):
+    """
+    Convierte un texto a minúsculas y sin tildes.
+    Args:
+        texto (str): Texto a normalizar.
+    Returns:
+        str: Texto normalizado.
+    """
+    texto = unicodedata.normalize('NFKD', str(texto).lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+def _slug(texto):
+    """Genera un nombre de directorio seguro a partir de un texto"""
+    return re.sub(r'[^a-z0-9]+', '-', normalizar_texto(texto)).strip('-')
+
+
+def _bloque_duracion(minutos):
+    """Devuelve la etiqueta del bloque de duración para unos minutos dados"""
+    for inicio, fin in TIME_BUCKETS:
+        if minutos > inicio and (fin is None or minutos <= fin):
+            return f"{inicio:03d}-{fin:03d}" if fin is not None else f"{inicio:03d}-max"
+    return f"{TIME_BUCKETS[0][0]:03d}-{TIME_BUCKETS[0][1]:03d}"
+
+
+def _firma_fuentes(rutas):
+    """
+    Calcula una firma de los ficheros de origen para detectar cambios.
+    Se usa el hash del contenido y no la fecha de modificación, que cambia al copiar
+    o desplegar los ficheros aunque su contenido sea el mismo (la fecha solo decide si
+    hay que volver a calcular el hash, ver file_hash).
+    Args:
+        rutas (list): Rutas de los CSV de actividades.
+    Returns:
+        list: Nombre y hash SHA-256 de cada fichero.
+    """
+    return [[os.path.basename(ruta), file_hash(ruta)] for ruta in rutas]
+
+
+def _fichero_trozo(numero):
+    """Nombre del fichero de un trozo dentro del directorio de su partición"""
+    return f"{numero:05d}.pkl"
+
+
+def build_partitions(indoor_file, outdoor_file, directorio=PARTITIONS_DIR):
+    """
+    Particiona el catálogo de actividades en disco por tipo, categoría y bloque de duración.
+    Las filas se numeran de forma global y contigua: todas las de interior primero y,
+    dentro de cada partición, ordenadas por Tiempo_Estimado_Minutos. Cada partición se guarda
+    en trozos de FILAS_POR_TROZO filas.
+    Args:
+        indoor_file (str): CSV de actividades de interior.
+        outdoor_file (str): CSV de actividades de exterior.
+        directorio (str): Directorio de salida de las particiones.
+    Returns:
+        dict: Manifiesto con la descripción de cada partición.
+    """
+    indoor = pd.read_csv(indoor_file)
+    indoor['Tipo'] = TIPOS[0]
+    outdoor = pd.read_csv(outdoor_file)
+    outdoor['Tipo'] = TIPOS[1]
+    actividades = pd.concat([indoor, outdoor], ignore_index=True)
+    del indoor, outdoor
+
+    actividades['Bloque_Duracion'] = actividades['Tiempo_Estimado_Minutos'].map(_bloque_duracion)
+    actividades['Tipo'] = pd.Categorical(actividades['Tipo'], categories=TIPOS, ordered=True)
+    actividades = actividades.sort_values(
+        ['Tipo', 'Categoria_Principal', 'Bloque_Duracion', 'Tiempo_Estimado_Minutos'],
+        kind='stable'
+    ).reset_index(drop=True)
+    actividades['ID_Global'] = np.arange(len(actividades), dtype=np.int64)
+
+    # Borrar las particiones anteriores para no dejar trozos sueltos de otra versión del catálogo
+    for tipo in TIPOS:
+        shutil.rmtree(os.path.join(directorio, tipo), ignore_errors=True)
+
+    particiones = []
+    grupos = actividades.groupby(['Tipo', 'Categoria_Principal', 'Bloque_Duracion'], sort=True, observed=True)
+    for (tipo, categoria, bloque), grupo in grupos:
+        ruta = os.path.join(str(tipo), _slug(categoria), bloque)
+        os.makedirs(os.path.join(directorio, ruta), exist_ok=True)
+        grupo = grupo.drop(columns=['Tipo', 'Bloque_Duracion']).reset_index(drop=True)
+        trozos = 0
+        for trozos, inicio in enumerate(range(0, len(grupo), FILAS_POR_TROZO), start=1):
+            trozo = grupo.iloc[inicio:inicio + FILAS_POR_TROZO].reset_index(drop=True)
+            trozo.to_pickle(os.path.join(directorio, ruta, _fichero_trozo(trozos - 1)))
+
+        # Recuento acumulado por duración para saber cuántas filas caben en un tiempo dado
+        tiempos, recuentos = np.unique(grupo['Tiempo_Estimado_Minutos'].to_numpy(), return_counts=True)
+        particiones.append({
+            'tipo': str(tipo),
+            'categoria': categoria,
+            'bloque': bloque,
+            'ruta': ruta,
+            'trozos': trozos,
+            'inicio': int(grupo['ID_Global'].iloc[0]),
+            'filas': int(len(grupo)),
+            'tiempos': tiempos.tolist(),
+            'acumulado': np.cumsum(recuentos).tolist(),
+        })
+
+    manifiesto = {
+        'formato': FORMATO,
+        'fuentes': _firma_fuentes([indoor_file, outdoor_file]),
+        'total_filas': int(len(actividades)),
+        'limite_interior': int((actividades['Tipo'] == TIPOS[0]).sum()),
+        'particiones': particiones,
+    }
+    # Se escribe en un temporal y se renombra para que otro proceso nunca lea el manifiesto a medias
+    temporal = os.path.join(directorio, f"{MANIFEST_FILE}.tmp-{os.getpid()}")
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, ensure_ascii=False)
+    os.replace(temporal, os.path.join(directorio, MANIFEST_FILE))
+    logger.info(f"Catálogo particionado: {len(actividades)} filas en {len(particiones)} particiones")
+    return manifiesto
+
+
+class PartitionedCatalog:
+    """
+    Catálogo de actividades particionado en disco.
+    Solo carga los trozos de partición que necesita cada petición y mantiene en memoria
+    un número acotado de filas.
+    """
+
+    def __init__(self, manifiesto, directorio=PARTITIONS_DIR, max_filas=MAX_FILAS_EN_MEMORIA):
+        self.directorio = directorio
+        self.fuentes = manifiesto['fuentes']
+        self.particiones = manifiesto['particiones']
+        self.total_filas = manifiesto['total_filas']
+        self.limite_interior = manifiesto['limite_interior']
+        self.max_filas = max_filas
+        self._tipos = np.array([p['tipo'] for p in self.particiones])
+        self._categorias = np.array([p['categoria'] for p in self.particiones], dtype=object)
+        self._inicios = np.array([p['inicio'] for p in self.particiones], dtype=np.int64)
+        self._tiempos = [np.asarray(p['tiempos']) for p in self.particiones]
+        self._acumulados = [np.asarray(p['acumulado']) for p in self.particiones]
+        # Duración de cada fila por id global, reconstruida desde el manifiesto sin leer particiones
+        self.tiempos = np.concatenate([
+            np.repeat(t, np.diff(a, prepend=0)) for t, a in zip(self._tiempos, self._acumulados)
+        ]).astype(np.int16) if self.particiones else np.empty(0, dtype=np.int16)
+        self._recuentos = {}
+        self._cache = OrderedDict()
+        self._filas_en_cache = 0
+        self._lock = threading.Lock()
+        self._rng = np.random.default_rng()
+
+    def _cargar_trozo(self, indice, trozo):
+        """Carga un trozo de una partición desde disco, reutilizando los más recientes"""
+        clave = (indice, trozo)
+        with self._lock:
+            if clave in self._cache:
+                self._cache.move_to_end(clave)
+                return self._cache[clave]
+        ruta = os.path.join(self.directorio, self.particiones[indice]['ruta'], _fichero_trozo(trozo))
+        datos = pd.read_pickle(ruta)
+        with self._lock:
+            if clave not in self._cache:
+                self._cache[clave] = datos
+                self._filas_en_cache += len(datos)
+            # Liberar los trozos menos usados si se supera el límite de filas
+            while self._filas_en_cache > self.max_filas and len(self._cache) > 1:
+                _, antiguo = self._cache.popitem(last=False)
+                self._filas_en_cache -= len(antiguo)
+        return datos
+
+    def _fila(self, indice, desplazamiento):
+        """Fila de una partición por su posición dentro de ella, leyendo solo su trozo"""
+        trozo, posicion = divmod(int(desplazamiento), FILAS_POR_TROZO)
+        return self._cargar_trozo(indice, trozo).iloc[posicion]
+
+    def _filas_elegibles(self, tiempo_disponible):
+        """Número de filas de cada partición con duración menor o igual al tiempo disponible"""
+        if tiempo_disponible in self._recuentos:
+            return self._recuentos[tiempo_disponible].copy()
+        recuentos = np.zeros(len(self.particiones), dtype=np.int64)
+        for i, (tiempos, acumulado) in enumerate(zip(self._tiempos, self._acumulados)):
+            posicion = np.searchsorted(tiempos, tiempo_disponible, side='right')
+            if posicion > 0:
+                recuentos[i] = acumulado[posicion - 1]
+        self._recuentos[tiempo_disponible] = recuentos
+        return recuentos.copy()
+
+    def iter_partitions(self, columnas=None):
+        """
+        Recorre todas las particiones trozo a trozo, leyéndolas de disco sin guardarlas en la caché.
+        Args:
+            columnas (list): Columnas a conservar de cada trozo.
+        Returns:
+            generator: Tuplas (id global de la primera fila, pd.DataFrame del trozo).
+        """
+        for particion in self.particiones:
+            for trozo in range(particion['trozos']):
+                datos = pd.read_pickle(os.path.join(self.directorio, particion['ruta'], _fichero_trozo(trozo)))
+                if columnas is not None:
+                    datos = datos[columnas]
+                yield particion['inicio'] + trozo * FILAS_POR_TROZO, datos
+
+    def get_row(self, id_global):
+        """
+        Obtiene una actividad a partir de su identificador global.
+        Args:
+            id_global (int): Identificador global de la actividad.
+        Returns:
+            pd.Series: Fila con los datos de la actividad.
+        """
+        indice = int(np.searchsorted(self._inicios, id_global, side='right')) - 1
+        return self._fila(indice, id_global - self._inicios[indice])
+
+    def sample(self, incluir_exterior, tiempo_disponible, excluidas=None, categoria=None,
+               categoria_distinta=None, subcategoria_distinta=None):
+        """
+        Elige una actividad al azar entre las que cumplen los filtros, sin combinar las particiones.
+        Args:
+            incluir_exterior (bool): Si se incluyen actividades de exterior.
+            tiempo_disponible (int): Tiempo disponible en minutos.
+            excluidas (set): Nombres de tareas excluidas.
+            categoria (str): Si se indica, solo se busca en esta categoría principal.
+            categoria_distinta (str): Si se indica, se descarta esta categoría principal.
+            subcategoria_distinta (str): Si se indica, se descarta esta subcategoría.
+        Returns:
+            pd.Series: Una fila con la tarea sugerida o None si no hay ninguna.
+        """
+        pesos = self._filas_elegibles(tiempo_disponible)
+        if not incluir_exterior:
+            pesos[self._tipos != TIPOS[0]] = 0
+        if categoria is not None:
+            pesos[self._categorias != categoria] = 0
+        if categoria_distinta is not None:
+            pesos[self._categorias == categoria_distinta] = 0
+
+        acumulado = np.cumsum(pesos)
+        total = int(acumulado[-1]) if len(acumulado) else 0
+        if total == 0:
+            return None
+
+        def es_valida(tarea):
+            if excluidas and tarea['Nombre_Tarea'] in excluidas:
+                return False
+            return subcategoria_distinta is None or tarea['Subcategoria'] != subcategoria_distinta
+
+        # Muestreo por rechazo: cada fila elegible tiene la misma probabilidad
+        for _ in range(MAX_INTENTOS):
+            posicion = int(self._rng.integers(total))
+            indice = int(np.searchsorted(acumulado, posicion, side='right'))
+            desplazamiento = posicion - (int(acumulado[indice - 1]) if indice > 0 else 0)
+            tarea = self._fila(indice, desplazamiento)
+            if es_valida(tarea):
+                return tarea
+
+        # Si casi todo está excluido, recorremos los trozos elegibles con muestreo de reservorio
+        seleccionada = None
+        vistas = 0
+        for indice in np.flatnonzero(pesos):
+            for trozo in range(-(-int(pesos[indice]) // FILAS_POR_TROZO)):
+                candidatas = self._cargar_trozo(indice, trozo).iloc[:pesos[indice] - trozo * FILAS_POR_TROZO]
+                mascara = np.ones(len(candidatas), dtype=bool)
+                if excluidas:
+                    mascara &= ~candidatas['Nombre_Tarea'].isin(excluidas).to_numpy()
+                if subcategoria_distinta is not None:
+                    mascara &= (candidatas['Subcategoria'] != subcategoria_distinta).to_numpy()
+                validas = np.flatnonzero(mascara)
+                if len(validas) == 0:
+                    continue
+                vistas += len(validas)
+                if self._rng.random() < len(validas) / vistas:
+                    seleccionada = candidatas.iloc[int(self._rng.choice(validas))]
+        return seleccionada
+
+
+def open_catalog(indoor_file, outdoor_file, directorio=PARTITIONS_DIR):
+    """
+    Abre el catálogo particionado, reconstruyéndolo si los CSV de origen han cambiado.
+    Args:
+        indoor_file (str): CSV de actividades de interior.
+        outdoor_file (str): CSV de actividades de exterior.
+        directorio (str): Directorio de las particiones.
+    Returns:
+        PartitionedCatalog: Catálogo listo para muestrear.
+    """
+    ruta_manifiesto = os.path.join(directorio, MANIFEST_FILE)
+    manifiesto = None
+    if os.path.exists(ruta_manifiesto):
+        with open(ruta_manifiesto, encoding='utf-8') as f:
+            manifiesto = json.load(f)
+        if (manifiesto.get('formato') != FORMATO
+                or manifiesto.get('fuentes') != _firma_fuentes([indoor_file, outdoor_file])):
+            manifiesto = None
+    if manifiesto is None:
+        manifiesto = build_partitions(indoor_file, outdoor_file, directorio)
+    return PartitionedCatalog(manifiesto, directorio)
@@ -0,0 +1,28 @@
+import logging
+from functools import lru_cache
+
+import yaml
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Ruta del archivo de configuración
+CONFIG_FILE = "config.yaml"
+
+
+@lru_cache(maxsize=None)
+def load_config(ruta=CONFIG_FILE):
+    """
+    Carga la configuración de la aplicación desde el archivo YAML.
+    Args:
+        ruta (str): Ruta del archivo de configuración.
+    Returns:
+        dict: Configuración de la aplicación (vacía si no se puede leer el archivo).
+    """
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            return yaml.safe_load(f) or {}
+    except (OSError, yaml.YAMLError) as e:
+        logger.error(f"Error al cargar la configuración: {str(e)}")
+        return {}
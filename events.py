@@ -0,0 +1,136 @@
+import atexit
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Base de datos local donde se guardan los eventos
+EVENTS_DB = "data/events.sqlite3"
+
+# Eventos que caben en memoria antes de aplicar contrapresión
+CAPACIDAD = 10_000
+
+# Eventos que se escriben en cada transacción
+TAMANO_LOTE = 500
+
+# Segundos máximos que un evento espera en memoria antes de escribirse
+INTERVALO_ESCRITURA = 2.0
+
+# Segundos que se espera a que haya hueco cuando el búfer está lleno antes de descartar el evento
+ESPERA_MAXIMA = 0.001
+
+
+class EventLog:
+    """
+    Registro de interacciones (sugerencias, "algo similar", "algo diferente" y aceptaciones).
+    Los eventos se guardan en un búfer acotado en memoria y un hilo en segundo plano los
+    escribe por lotes en SQLite, de modo que registrar un evento no espera al disco.
+    """
+
+    def __init__(self, ruta=EVENTS_DB, capacidad=CAPACIDAD, tamano_lote=TAMANO_LOTE,
+                 intervalo=INTERVALO_ESCRITURA):
+        self.ruta = ruta
+        self.tamano_lote = tamano_lote
+        self.intervalo = intervalo
+        self.descartados = 0
+        self._cola = queue.Queue(maxsize=capacidad)
+        self._hilo = threading.Thread(target=self._escribir, daemon=True)
+        self._hilo.start()
+        # Escribir lo pendiente al cerrar el proceso
+        atexit.register(self.flush, 2 * intervalo)
+
+    def record(self, tipo, sesion, id_global=None, nombre_tarea=None, municipio=None, clima=None):
+        """
+        Añade un evento al búfer. Si el búfer está lleno espera un instante y, si sigue lleno,
+        descarta el evento para no retrasar la petición.
+        Args:
+            tipo (str): Tipo de evento ('suggestion', 'similar', 'different' o 'accept').
+            sesion (str): Identificador de la sesión del usuario.
+            id_global (int): Identificador global de la actividad.
+            nombre_tarea (str): Nombre de la actividad.
+            municipio (str): Municipio del usuario.
+            clima (str): Veredicto del clima ('good' o 'bad').
+        Returns:
+            bool: True si el evento se ha encolado, False si se ha descartado.
+        """
+        evento = (
+            time.time(), tipo, sesion,
+            None if id_global is None else int(id_global), nombre_tarea, municipio, clima
+        )
+        try:
+            self._cola.put_nowait(evento)
+        except queue.Full:
+            try:
+                self._cola.put(evento, timeout=ESPERA_MAXIMA)
+            except queue.Full:
+                self.descartados += 1
+                return False
+        return True
+
+    def flush(self, timeout=None):
+        """
+        Espera a que todos los eventos encolados se hayan escrito.
+        Args:
+            timeout (float): Segundos máximos de espera (None para esperar sin límite).
+        Returns:
+            bool: True si no quedan eventos pendientes.
+        """
+        with self._cola.all_tasks_done:
+            return self._cola.all_tasks_done.wait_for(lambda: not self._cola.unfinished_tasks, timeout)
+
+    def _escribir(self):
+        """Bucle del hilo de escritura: agrupa los eventos en lotes y los guarda en SQLite"""
+        conexion = sqlite3.connect(self.ruta)
+        conexion.execute("""
+            CREATE TABLE IF NOT EXISTS eventos (
+                ts REAL, tipo TEXT, sesion TEXT, id_global INTEGER,
+                nombre_tarea TEXT, municipio TEXT, clima TEXT
+            )
+        """)
+        conexion.commit()
+        while True:
+            lote = [self._cola.get()]
+            limite = time.monotonic() + self.intervalo
+            while len(lote) < self.tamano_lote:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(self._cola.get(timeout=restante))
+                except queue.Empty:
+                    break
+            try:
+                with conexion:
+                    conexion.executemany("INSERT INTO eventos VALUES (?, ?, ?, ?, ?, ?, ?)", lote)
+            except Exception as e:
+                logger.error(f"Error al guardar {len(lote)} eventos: {str(e)}")
+            finally:
+                for _ in lote:
+                    self._cola.task_done()
+
+
+def medir_sobrecarga(eventos=100_000, ruta=":memory:"):
+    """
+    Mide el coste medio de registrar un evento desde el hilo de la petición.
+    Args:
+        eventos (int): Número de eventos a registrar.
+        ruta (str): Base de datos de destino.
+    Returns:
+        float: Microsegundos por evento.
+    """
+    registro = EventLog(ruta, capacidad=eventos)
+    inicio = time.perf_counter()
+    for i in range(eventos):
+        registro.record('suggestion', 'benchmark', i, 'Actividad de prueba', 'Cádiz', 'good')
+    duracion = time.perf_counter() - inicio
+    registro.flush()
+    return duracion / eventos * 1e6
+
+
+if __name__ == '__main__':
+    print(f"Sobrecarga por evento: {medir_sobrecarga():.2f} µs")
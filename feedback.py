@@ -0,0 +1,170 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Número de respuestas acumuladas que provocan una reconstrucción de la tabla
+TAMANO_LOTE = 50
+
+# Segundos tras los que cualquier respuesta nueva provoca una reconstrucción, aunque el lote no esté completo
+INTERVALO_RECONSTRUCCION = 30
+
+# Resolución de los niveles de peso: cuatro niveles por cada potencia de dos
+NIVELES_POR_OCTAVA = 4
+NIVEL_MINIMO = -40
+NIVEL_MAXIMO = 8
+
+# Intentos de muestreo por rechazo antes de recurrir al muestreo uniforme del catálogo
+MAX_INTENTOS = 32
+
+
+def _tabla_alias(pesos):
+    """
+    Construye una tabla de alias (método de Vose) para muestrear en tiempo constante.
+    Args:
+        pesos (np.ndarray): Peso de cada elemento.
+    Returns:
+        tuple: Listas (probabilidad, alias) de la tabla.
+    """
+    n = len(pesos)
+    escalados = list(pesos * n / pesos.sum())
+    probabilidad = [1.0] * n
+    alias = list(range(n))
+    pequenos = [i for i, p in enumerate(escalados) if p < 1]
+    grandes = [i for i, p in enumerate(escalados) if p >= 1]
+    while pequenos and grandes:
+        pequeno, grande = pequenos.pop(), grandes.pop()
+        probabilidad[pequeno] = escalados[pequeno]
+        alias[pequeno] = grande
+        escalados[grande] -= 1 - escalados[pequeno]
+        (pequenos if escalados[grande] < 1 else grandes).append(grande)
+    return probabilidad, alias
+
+
+class FeedbackSampler:
+    """
+    Muestreador ponderado por las respuestas de los usuarios ("¡Voy a hacerlo!" frente a
+    "Algo similar" / "Algo diferente").
+    Las actividades se agrupan en niveles de peso: se elige un nivel con una tabla de alias y
+    después una actividad uniforme dentro del nivel, ambas cosas en tiempo constante.
+    Las respuestas se acumulan sin bloquear y la tabla se reconstruye por lotes en segundo plano.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        total = catalog.total_filas
+        self.nombres_categorias, codigos = np.unique(
+            [p['categoria'] for p in catalog.particiones], return_inverse=True
+        )
+        self._categoria_fila = np.repeat(codigos, [p['filas'] for p in catalog.particiones])
+        self.aceptadas = np.zeros(total, dtype=np.int32)
+        self.descartadas = np.zeros(total, dtype=np.int32)
+        self.aceptadas_categoria = np.zeros(len(self.nombres_categorias), dtype=np.int32)
+        self.descartadas_categoria = np.zeros(len(self.nombres_categorias), dtype=np.int32)
+        self._pendientes = deque()
+        self._reconstruyendo = threading.Lock()
+        self._ultima_reconstruccion = time.monotonic()
+        self._tabla = None
+        self._reconstruir()
+
+    def _pesos(self):
+        """Media a posteriori (Beta(1, 1)) de aceptación por actividad y por categoría"""
+        por_actividad = (self.aceptadas + 1) / (self.aceptadas + self.descartadas + 2)
+        por_categoria = (self.aceptadas_categoria + 1) / (self.aceptadas_categoria + self.descartadas_categoria + 2)
+        # Sin respuestas ambos valen 0.5, así que el peso base es 1
+        return por_actividad * por_categoria[self._categoria_fila] * 4
+
+    def _reconstruir(self):
+        """Aplica las respuestas pendientes y sustituye la tabla de muestreo"""
+        ids, aceptadas = [], []
+        while self._pendientes:
+            id_global, aceptada = self._pendientes.popleft()
+            ids.append(id_global)
+            aceptadas.append(aceptada)
+        if ids:
+            ids = np.asarray(ids, dtype=np.int64)
+            aceptadas = np.asarray(aceptadas, dtype=bool)
+            np.add.at(self.aceptadas, ids[aceptadas], 1)
+            np.add.at(self.descartadas, ids[~aceptadas], 1)
+            np.add.at(self.aceptadas_categoria, self._categoria_fila[ids[aceptadas]], 1)
+            np.add.at(self.descartadas_categoria, self._categoria_fila[ids[~aceptadas]], 1)
+
+        # Cuantizar los pesos en niveles y agrupar las actividades de cada nivel
+        niveles = np.clip(
+            np.rint(np.log2(self._pesos()) * NIVELES_POR_OCTAVA), NIVEL_MINIMO, NIVEL_MAXIMO
+        ).astype(np.int8) - NIVEL_MINIMO
+        ids_por_nivel = np.argsort(niveles, kind='stable').astype(np.int32)
+        conteos = np.bincount(niveles, minlength=NIVEL_MAXIMO - NIVEL_MINIMO + 1)
+        inicios = np.concatenate([[0], np.cumsum(conteos)[:-1]])
+        ocupados = np.flatnonzero(conteos)
+        pesos_nivel = conteos[ocupados] * 2.0 ** ((ocupados + NIVEL_MINIMO) / NIVELES_POR_OCTAVA)
+        probabilidad, alias = _tabla_alias(pesos_nivel)
+
+        # La tabla se sustituye de una vez para que las lecturas nunca vean un estado intermedio
+        self._tabla = (
+            probabilidad, alias, conteos[ocupados].tolist(), inicios[ocupados].tolist(), ids_por_nivel
+        )
+        self._ultima_reconstruccion = time.monotonic()
+
+    def _reconstruir_en_segundo_plano(self):
+        """Reconstruye la tabla en un hilo aparte si no hay otra reconstrucción en curso"""
+        if not self._reconstruyendo.acquire(blocking=False):
+            return
+
+        def tarea():
+            try:
+                self._reconstruir()
+            except Exception as e:
+                logger.error(f"Error al reconstruir la tabla de muestreo: {str(e)}")
+            finally:
+                self._reconstruyendo.release()
+
+        threading.Thread(target=tarea, daemon=True).start()
+
+    def record(self, id_global, aceptada):
+        """
+        Registra la respuesta de un usuario a una sugerencia sin bloquear la petición.
+        Args:
+            id_global (int): Identificador global de la actividad sugerida.
+            aceptada (bool): True si el usuario la aceptó, False si pidió otra.
+        """
+        self._pendientes.append((int(id_global), bool(aceptada)))
+        if (len(self._pendientes) >= TAMANO_LOTE or
+                time.monotonic() - self._ultima_reconstruccion > INTERVALO_RECONSTRUCCION):
+            self._reconstruir_en_segundo_plano()
+
+    def _draw(self):
+        """Extrae un identificador global según los pesos actuales"""
+        probabilidad, alias, conteos, inicios, ids_por_nivel = self._tabla
+        columna = random.randrange(len(probabilidad))
+        nivel = columna if random.random() < probabilidad[columna] else alias[columna]
+        return ids_por_nivel[inicios[nivel] + random.randrange(conteos[nivel])]
+
+    def sample(self, incluir_exterior, tiempo_disponible, excluidas=None):
+        """
+        Elige una actividad ponderada por las respuestas dentro de los filtros de clima y tiempo.
+        Args:
+            incluir_exterior (bool): Si se incluyen actividades de exterior.
+            tiempo_disponible (int): Tiempo disponible en minutos.
+            excluidas (set): Nombres de tareas excluidas.
+        Returns:
+            pd.Series: Una fila con la tarea sugerida o None si no hay ninguna.
+        """
+        for _ in range(MAX_INTENTOS):
+            id_global = self._draw()
+            if self.catalog.tiempos[id_global] > tiempo_disponible:
+                continue
+            if not incluir_exterior and id_global >= self.catalog.limite_interior:
+                continue
+            tarea = self.catalog.get_row(id_global)
+            if not excluidas or tarea['Nombre_Tarea'] not in excluidas:
+                return tarea
+        # Si los filtros son muy restrictivos, muestreo uniforme dentro de ellos
+        return self.catalog.sample(incluir_exterior, tiempo_disponible, excluidas)
@@ -0,0 +1,187 @@
+import logging
+import re
+from collections import defaultdict
+
+import numpy as np
+
+from catalog import normalizar_texto
+from snapshots import SNAPSHOTS_DIR, load_snapshot, save_snapshot, snapshot_version
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Columnas de texto que se indexan
+TEXT_COLUMNS = ['Nombre_Tarea', 'Descripcion']
+
+# Palabras vacías en español (ya sin tildes) que no se indexan ni se buscan
+STOPWORDS = {
+    'a', 'al', 'algo', 'ante', 'bajo', 'categoria', 'como', 'con', 'de', 'del', 'desde', 'dentro',
+    'disfruta', 'e', 'el', 'ella', 'ellos', 'en', 'entre', 'era', 'es', 'esta', 'este', 'esto', 'hacer',
+    'hasta', 'la', 'las', 'le', 'les', 'lo', 'los', 'mas', 'me', 'mi', 'mis', 'muy', 'ni', 'no',
+    'o', 'os', 'para', 'pero', 'por', 'que', 'quiero', 'se', 'si', 'sin', 'sobre', 'su', 'sus',
+    'te', 'tu', 'tus', 'u', 'un', 'una', 'unas', 'uno', 'unos', 'y', 'ya',
+}
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+# Intentos de muestreo por rechazo antes de recorrer los candidatos
+MAX_INTENTOS = 16
+
+# Versión del formato del índice: cambiarla si cambia la tokenización para invalidar las instantáneas
+FORMATO = 1
+
+
+def _raiz(token):
+    """Reduce plurales y género de forma sencilla: 'canciones' -> 'cancion', 'kayaks' -> 'kayak'"""
+    if len(token) > 4 and token.endswith('s'):
+        token = token[:-1]
+    if len(token) > 4 and token[-1] in 'aeo':
+        token = token[:-1]
+    return token
+
+
+def tokenizar(texto):
+    """
+    Divide un texto en términos normalizados (sin tildes, sin palabras vacías y reducidos a su raíz).
+    Args:
+        texto (str): Texto a tokenizar.
+    Returns:
+        list: Términos del texto.
+    """
+    return [_raiz(t) for t in TOKEN_PATTERN.findall(normalizar_texto(texto)) if t not in STOPWORDS]
+
+
+class KeywordIndex:
+    """
+    Índice invertido sobre Nombre_Tarea y Descripcion.
+    Cada término apunta a un array ordenado de identificadores globales del catálogo.
+    """
+
+    def __init__(self, terminos, offsets, postings, tiempos, limite_interior):
+        self._terminos = terminos
+        self._offsets = offsets
+        self._postings = postings
+        self._tiempos = tiempos
+        self.limite_interior = limite_interior
+        self._rng = np.random.default_rng()
+
+    @classmethod
+    def build(cls, catalog):
+        """
+        Construye el índice recorriendo una vez las particiones del catálogo.
+        Args:
+            catalog (PartitionedCatalog): Catálogo de actividades.
+        Returns:
+            KeywordIndex: Índice listo para consultar.
+        """
+        listas = defaultdict(list)
+        for inicio, datos in catalog.iter_partitions(TEXT_COLUMNS):
+            textos = datos['Nombre_Tarea'].fillna('') + ' ' + datos['Descripcion'].fillna('')
+            for desplazamiento, texto in enumerate(textos):
+                for termino in set(tokenizar(texto)):
+                    listas[termino].append(inicio + desplazamiento)
+
+        # Las particiones se recorren en orden de id, así que cada lista ya está ordenada
+        terminos = {}
+        longitudes = np.zeros(len(listas), dtype=np.int64)
+        for i, (termino, ids) in enumerate(listas.items()):
+            terminos[termino] = i
+            longitudes[i] = len(ids)
+        offsets = np.concatenate([[0], np.cumsum(longitudes)])
+        postings = np.fromiter(
+            (id_global for ids in listas.values() for id_global in ids),
+            dtype=np.int32, count=int(offsets[-1])
+        )
+        logger.info(f"Índice de palabras clave: {len(terminos)} términos, {len(postings)} entradas")
+        return cls(terminos, offsets, postings, catalog.tiempos, catalog.limite_interior)
+
+    def save(self, version, directorio=SNAPSHOTS_DIR):
+        """Guarda los arrays del índice como instantánea"""
+        save_snapshot('keywords', version, {
+            'terminos': np.array(list(self._terminos), dtype=str),
+            'offsets': self._offsets,
+            'postings': self._postings,
+        }, directorio)
+
+    @classmethod
+    def load(cls, catalog, version, directorio=SNAPSHOTS_DIR):
+        """
+        Abre el índice desde su instantánea, con las entradas proyectadas en memoria.
+        Returns:
+            KeywordIndex: Índice listo para consultar o None si no hay instantánea de esa versión.
+        """
+        arrays = load_snapshot('keywords', version, directorio)
+        if arrays is None:
+            return None
+        terminos = {termino: i for i, termino in enumerate(arrays['terminos'].tolist())}
+        return cls(terminos, arrays['offsets'], arrays['postings'], catalog.tiempos, catalog.limite_interior)
+
+    def postings(self, termino):
+        """Devuelve el array ordenado de identificadores de un término (None si no está indexado)"""
+        i = self._terminos.get(termino)
+        if i is None:
+            return None
+        return self._postings[self._offsets[i]:self._offsets[i + 1]]
+
+    def search(self, query, incluir_exterior, tiempo_disponible):
+        """
+        Busca las actividades que contienen alguno de los términos de la consulta.
+        Args:
+            query (str): Consulta libre, p. ej. "algo con música o kayak".
+            incluir_exterior (bool): Si se incluyen actividades de exterior.
+            tiempo_disponible (int): Tiempo disponible en minutos.
+        Returns:
+            np.ndarray: Identificadores globales ordenados que cumplen los filtros.
+        """
+        listas = [p for p in (self.postings(t) for t in set(tokenizar(query))) if p is not None]
+        if not listas:
+            return np.empty(0, dtype=np.int32)
+        candidatos = listas[0] if len(listas) == 1 else np.unique(np.concatenate(listas))
+
+        # Las actividades de interior ocupan los primeros identificadores
+        if not incluir_exterior:
+            candidatos = candidatos[:np.searchsorted(candidatos, self.limite_interior)]
+        return candidatos[self._tiempos[candidatos] <= tiempo_disponible]
+
+    def sample(self, catalog, query, incluir_exterior, tiempo_disponible, excluidas=None):
+        """
+        Elige al azar una actividad que coincida con la consulta y cumpla los filtros.
+        Args:
+            catalog (PartitionedCatalog): Catálogo del que se leen las filas.
+            query (str): Consulta libre.
+            incluir_exterior (bool): Si se incluyen actividades de exterior.
+            tiempo_disponible (int): Tiempo disponible en minutos.
+            excluidas (set): Nombres de tareas excluidas.
+        Returns:
+            pd.Series: Una fila con la tarea sugerida o None si no hay ninguna.
+        """
+        candidatos = self.search(query, incluir_exterior, tiempo_disponible)
+        if len(candidatos) == 0:
+            return None
+        for _ in range(MAX_INTENTOS):
+            tarea = catalog.get_row(candidatos[self._rng.integers(len(candidatos))])
+            if not excluidas or tarea['Nombre_Tarea'] not in excluidas:
+                return tarea
+        for id_global in self._rng.permutation(candidatos):
+            tarea = catalog.get_row(id_global)
+            if tarea['Nombre_Tarea'] not in excluidas:
+                return tarea
+        return None
+
+
+def open_keyword_index(catalog, directorio=SNAPSHOTS_DIR):
+    """
+    Abre el índice desde la instantánea que corresponde al catálogo, construyéndolo si no existe.
+    Args:
+        catalog (PartitionedCatalog): Catálogo de actividades.
+        directorio (str): Directorio de las instantáneas.
+    Returns:
+        KeywordIndex: Índice listo para consultar.
+    """
+    version = snapshot_version(catalog.fuentes, FORMATO)
+    indice = KeywordIndex.load(catalog, version, directorio)
+    if indice is None:
+        indice = KeywordIndex.build(catalog)
+        indice.save(version, directorio)
+    return indice
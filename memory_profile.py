@@ -0,0 +1,252 @@
+import gc
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+from functools import partial
+
+import numpy as np
+
+from catalog import open_catalog
+from config import load_config
+from events import EventLog
+from feedback import FeedbackSampler
+from keyword_index import open_keyword_index
+from municipalities import open_registry
+from similarity import open_similarity_index
+from suggestions import SuggestionEngine
+from weather import AemetClient
+
+# Guion de una sesión: acción y parámetros de cada interacción, como los haría un usuario en main()
+GUION = [
+    ('weather', {}),
+    ('suggest', {'tiempo': 60}),
+    ('similar', {}),
+    ('different', {}),
+    ('suggest', {'tiempo': 120, 'query': 'musica'}),
+    ('similar', {}),
+    ('different', {}),
+    ('accept', {}),
+]
+
+# Sesiones que se ejecutan antes de medir para cargar particiones y cachés compartidas
+SESIONES_CALENTAMIENTO = 3
+
+
+def _payload_sintetico(dias=7):
+    """Predicción diaria con la misma estructura que devuelve AEMET, empezando hoy"""
+    hoy = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    periodos = ['00-24', '00-12', '12-24', '00-06', '06-12', '12-18', '18-24']
+    return json.dumps([{
+        'origen': {'productor': 'Agencia Estatal de Meteorología - AEMET. Gobierno de España'},
+        'elaborado': hoy.strftime('%Y-%m-%dT%H:%M:%S'),
+        'nombre': 'Cádiz',
+        'provincia': 'Cádiz',
+        'prediccion': {'dia': [{
+            'probPrecipitacion': [{'value': (i * 13) % 100, 'periodo': p} for i, p in enumerate(periodos)],
+            'cotaNieveProv': [{'value': '', 'periodo': p} for p in periodos],
+            'estadoCielo': [{'value': '12', 'periodo': p, 'descripcion': 'Poco nuboso'} for p in periodos],
+            'viento': [{'direccion': 'SO', 'velocidad': (i * 11) % 60, 'periodo': p} for i, p in enumerate(periodos)],
+            'rachaMax': [{'value': '', 'periodo': p} for p in periodos],
+            'temperatura': {'maxima': 24, 'minima': 16, 'dato': [{'value': 18, 'hora': h} for h in (6, 12, 18, 24)]},
+            'sensTermica': {'maxima': 24, 'minima': 16, 'dato': [{'value': 18, 'hora': h} for h in (6, 12, 18, 24)]},
+            'humedadRelativa': {'maxima': 85, 'minima': 50, 'dato': [{'value': 70, 'hora': h} for h in (6, 12, 18, 24)]},
+            'uvMax': 5,
+            'fecha': (hoy + timedelta(days=d)).strftime('%Y-%m-%dT%H:%M:%S'),
+        } for d in range(dias)]},
+        'id': 11012,
+        'version': 1.0,
+    }])
+
+
+class ReplayAemetClient(AemetClient):
+    """Cliente de AEMET que devuelve siempre la misma predicción grabada, sin llamar a la red"""
+
+    def __init__(self, payload):
+        super().__init__(api_key=None)
+        self._payload = payload
+
+    def _descargar(self, municipio_id, espera_cuota):
+        """Decodifica la predicción grabada como si acabara de llegar de AEMET"""
+        return json.loads(self._payload)
+
+
+class SessionReplayer:
+    """
+    Reproduce sesiones guionizadas por los caminos de sugerencias y clima de la aplicación
+    (SuggestionEngine), con los mismos objetos compartidos que crea streamlit_app.py.
+    """
+
+    def __init__(self, payload, ruta_eventos):
+        catalog = open_catalog('data/cleaned/home_activities.csv', 'data/cleaned/outdoor_activities.csv')
+        self.feedback_sampler = FeedbackSampler(catalog)
+        self.municipios = open_registry()
+        self.event_log = EventLog(ruta_eventos, intervalo=0)
+        # Sin tabla de veredictos: el clima siempre pasa por AEMET, el camino más costoso
+        self.engine = SuggestionEngine(
+            catalog, open_keyword_index(catalog), open_similarity_index(catalog), self.feedback_sampler,
+            self.event_log, ReplayAemetClient(payload), config=load_config()
+        )
+        self._rng = np.random.default_rng(0)
+
+    def new_session(self):
+        """Estado de una sesión nueva, como st.session_state en main()"""
+        municipio = self.municipios.record(int(self._rng.integers(len(self.municipios))))
+        return {
+            'session_id': f"replay-{self._rng.integers(1 << 32):08x}",
+            'municipio': municipio,
+            'weather': 'unknown',
+            'current_task': None,
+            'excluded_tasks': set(),
+            'time': 60,
+        }
+
+    def _registrar(self, sesion, tipo, tarea):
+        """Registra el evento y lo escribe ya, para que la memoria del búfer se mida en su interacción"""
+        self.engine.log_event(tipo, sesion['session_id'], tarea, sesion['municipio'].nombre, sesion['weather'])
+        self.event_log.flush()
+
+    def _nueva_tarea(self, sesion, tarea):
+        """Guarda la tarea sugerida como actual y la excluye de las siguientes sugerencias"""
+        if tarea is not None:
+            sesion['current_task'] = tarea
+            sesion['excluded_tasks'].add(tarea['Nombre_Tarea'])
+
+    def run(self, sesion, accion, tiempo=None, query=None):
+        """
+        Ejecuta una interacción sobre el estado de la sesión.
+        Args:
+            sesion (dict): Estado de la sesión.
+            accion (str): 'weather', 'suggest', 'similar', 'different' o 'accept'.
+            tiempo (int): Nuevo tiempo disponible del slider (opcional).
+            query (str): Palabras clave (solo para 'suggest').
+        """
+        if tiempo is not None:
+            sesion['time'] = tiempo
+        exterior = sesion['weather'] == 'good'
+        actual = sesion['current_task']
+
+        if accion == 'weather':
+            sesion['weather'], _, _ = self.engine.get_weather(sesion['municipio'])
+        elif accion == 'suggest':
+            tarea = self.engine.suggest_task(exterior, sesion['time'], sesion['excluded_tasks'], query)
+            self._registrar(sesion, 'suggestion', tarea)
+            self._nueva_tarea(sesion, tarea)
+        elif actual is None:
+            return
+        elif accion == 'similar':
+            self.feedback_sampler.record(actual['ID_Global'], aceptada=False)
+            tarea = self.engine.suggest_similar_task(
+                actual['Categoria_Principal'], actual['Subcategoria'], sesion['time'], exterior,
+                sesion['excluded_tasks'], actual['ID_Global']
+            )
+            self._registrar(sesion, 'similar', tarea)
+            self._nueva_tarea(sesion, tarea)
+        elif accion == 'different':
+            self.feedback_sampler.record(actual['ID_Global'], aceptada=False)
+            tarea = self.engine.suggest_different_task(
+                actual['Categoria_Principal'], sesion['time'], exterior, sesion['excluded_tasks']
+            )
+            self._registrar(sesion, 'different', tarea)
+            self._nueva_tarea(sesion, tarea)
+        elif accion == 'accept':
+            self.feedback_sampler.record(actual['ID_Global'], aceptada=True)
+            self._registrar(sesion, 'accept', actual)
+
+
+def _medir(funcion):
+    """
+    Ejecuta una función y mide su memoria con tracemalloc.
+    Returns:
+        tuple: (bytes asignados en el pico, bytes que siguen retenidos al terminar)
+    """
+    gc.collect()
+    antes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    funcion()
+    pico = tracemalloc.get_traced_memory()[1]
+    gc.collect()
+    return pico - antes, tracemalloc.get_traced_memory()[0] - antes
+
+
+def profile_sessions(sesiones, guion=GUION, payload=None):
+    """
+    Reproduce varias sesiones guionizadas midiendo la memoria de cada interacción y de cada sesión.
+    Args:
+        sesiones (int): Número de sesiones medidas.
+        guion (list): Interacciones de cada sesión.
+        payload (str): Predicción de AEMET grabada en JSON (por defecto, una sintética).
+    Returns:
+        dict: Bytes asignados y retenidos por acción ('interacciones') y retenidos por sesión ('sesiones').
+    """
+    with tempfile.TemporaryDirectory() as directorio:
+        reproductor = SessionReplayer(payload or _payload_sintetico(), os.path.join(directorio, 'eventos.sqlite3'))
+        for _ in range(SESIONES_CALENTAMIENTO):
+            sesion = reproductor.new_session()
+            for accion, parametros in guion:
+                reproductor.run(sesion, accion, **parametros)
+
+        interacciones = {}
+        retenidos_sesion = []
+        tracemalloc.start()
+        try:
+            for _ in range(sesiones):
+                gc.collect()
+                inicio = tracemalloc.get_traced_memory()[0]
+                sesion = reproductor.new_session()
+                for accion, parametros in guion:
+                    asignados, retenidos = _medir(partial(reproductor.run, sesion, accion, **parametros))
+                    interacciones.setdefault(accion, []).append((asignados, retenidos))
+                gc.collect()
+                # Memoria de la sesión: su estado más lo que ha dejado en las cachés compartidas
+                retenidos_sesion.append(tracemalloc.get_traced_memory()[0] - inicio)
+        finally:
+            tracemalloc.stop()
+            reproductor.event_log.flush()
+    return {'interacciones': interacciones, 'sesiones': retenidos_sesion}
+
+
+def check_budgets(resultados, presupuestos):
+    """
+    Compara las mediciones con los presupuestos de config.yaml.
+    Args:
+        resultados (dict): Resultado de profile_sessions.
+        presupuestos (dict): Sección memory.budgets de config.yaml (bytes).
+    Returns:
+        list: Mensajes con los presupuestos superados (vacía si se cumplen todos).
+    """
+    errores = []
+    for accion, medidas in resultados['interacciones'].items():
+        asignados = max(m[0] for m in medidas)
+        retenidos = max(m[1] for m in medidas)
+        if asignados > presupuestos.get('interaction_allocated', float('inf')):
+            errores.append(f"{accion}: {asignados} bytes asignados (presupuesto {presupuestos['interaction_allocated']})")
+        if retenidos > presupuestos.get('interaction_retained', float('inf')):
+            errores.append(f"{accion}: {retenidos} bytes retenidos (presupuesto {presupuestos['interaction_retained']})")
+    retenidos = max(resultados['sesiones'])
+    if retenidos > presupuestos.get('session_retained', float('inf')):
+        errores.append(f"sesión: {retenidos} bytes retenidos (presupuesto {presupuestos['session_retained']})")
+    return errores
+
+
+if __name__ == '__main__':
+    # Uso: python memory_profile.py [prediccion_aemet.json]
+    memoria = load_config().get('memory', {})
+    payload = None
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding='utf-8') as f:
+            payload = f.read()
+    resultados = profile_sessions(memoria.get('sessions', 20), payload=payload)
+
+    print(f"{'acción':<10} {'asignados medio':>16} {'asignados máx':>14} {'retenidos medio':>16} {'retenidos máx':>14}")
+    for accion, medidas in resultados['interacciones'].items():
+        asignados, retenidos = np.array(medidas).T
+        print(f"{accion:<10} {asignados.mean():>16,.0f} {asignados.max():>14,} {retenidos.mean():>16,.0f} {retenidos.max():>14,}")
+    print(f"{'sesión':<10} {'':>16} {'':>14} {np.mean(resultados['sesiones']):>16,.0f} {max(resultados['sesiones']):>14,}")
+
+    errores = check_budgets(resultados, memoria.get('budgets', {}))
+    for error in errores:
+        print(f"Presupuesto superado: {error}")
+    sys.exit(1 if errores else 0)
@@ -0,0 +1,345 @@
+import logging
+import re
+from collections import defaultdict
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from catalog import normalizar_texto
+from snapshots import SNAPSHOTS_DIR, file_hash, load_snapshot, save_snapshot, snapshot_version
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Ruta del archivo CSV con los municipios
+MUNICIPIOS_FILE = "data/raw/municipios_aemet.csv"
+
+# Formato de las coordenadas en grados, minutos y segundos, p. ej. -0º48'28.084212"
+DMS_PATTERN = r'^\s*(?P<signo>-?)(?P<grados>\d+)º(?P<minutos>\d+)\'(?P<segundos>[\d.]+)"?\s*$'
+
+# Puntuación mínima (coeficiente de Dice sobre trigramas) para aceptar una coincidencia aproximada
+UMBRAL_SIMILITUD = 0.6
+
+# Diferencia de puntuación por debajo de la cual se desempata por cercanía
+MARGEN_DESEMPATE = 0.05
+
+# Con coordenadas, solo se aceptan coincidencias aproximadas a menos de esta distancia del usuario
+DISTANCIA_MAXIMA_KM = 10
+
+# Kilómetros por grado de latitud
+KM_POR_GRADO = 111.2
+
+# Versión del formato de la instantánea: cambiarla si cambia cómo se construye el registro
+FORMATO = 1
+
+# Separadores de las formas bilingües o compuestas, p. ej. "Donostia/San Sebastián"
+SEPARADORES_NOMBRE = re.compile(r'\s*(?:/|\s-\s|-)\s*')
+
+
+class Municipio(NamedTuple):
+    """Datos de un municipio de AEMET"""
+    codigo: int
+    nombre: str
+    capital: str
+    latitud: float
+    longitud: float
+    num_hab: int
+
+    @property
+    def id(self):
+        """Código de cinco cifras que espera la API de AEMET"""
+        return f"{self.codigo:05d}"
+
+
+def parse_dms(coordenadas):
+    """
+    Convierte coordenadas en grados, minutos y segundos a grados decimales de forma vectorizada.
+    Args:
+        coordenadas (pd.Series): Coordenadas en formato DMS.
+    Returns:
+        np.ndarray: Coordenadas decimales (NaN si no se pueden interpretar).
+    """
+    partes = coordenadas.astype(str).str.extract(DMS_PATTERN)
+    decimales = (
+        partes['grados'].astype(float)
+        + partes['minutos'].astype(float) / 60
+        + partes['segundos'].astype(float) / 3600
+    )
+    decimales = decimales.where(partes['signo'] != '-', -decimales)
+    return decimales.to_numpy(dtype=np.float64)
+
+
+def _trigramas(texto):
+    """Conjunto de trigramas de un texto normalizado y rodeado de espacios"""
+    texto = f"  {' '.join(normalizar_texto(texto).split())} "
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+class TrigramIndex:
+    """
+    Índice de trigramas para buscar nombres de municipio de forma aproximada.
+    Cada entrada es una variante de nombre (nombre, capital o una de sus partes) que apunta
+    a la posición del municipio en el registro.
+    """
+
+    def __init__(self, trigramas, offsets, postings, tamanos, municipios):
+        self._trigramas = trigramas
+        self._offsets = offsets
+        self._postings = postings
+        self._tamanos = tamanos
+        self._municipios = municipios
+
+    @classmethod
+    def build(cls, variantes, municipios):
+        """
+        Construye el índice a partir de las variantes de nombre.
+        Args:
+            variantes (list): Variantes de nombre.
+            municipios (list): Posición del municipio de cada variante.
+        Returns:
+            TrigramIndex: Índice listo para consultar.
+        """
+        listas = defaultdict(list)
+        tamanos = np.zeros(len(variantes), dtype=np.int32)
+        for entrada, variante in enumerate(variantes):
+            trigramas = _trigramas(variante)
+            tamanos[entrada] = len(trigramas)
+            for trigrama in trigramas:
+                listas[trigrama].append(entrada)
+        offsets = np.concatenate([[0], np.cumsum([len(e) for e in listas.values()])])
+        postings = np.fromiter(
+            (entrada for entradas in listas.values() for entrada in entradas),
+            dtype=np.int32, count=int(offsets[-1])
+        )
+        return cls(
+            {trigrama: i for i, trigrama in enumerate(listas)}, offsets, postings, tamanos,
+            np.asarray(municipios, dtype=np.int32)
+        )
+
+    def to_arrays(self):
+        """Arrays del índice para guardarlo como instantánea"""
+        return {
+            'trigramas': np.array(list(self._trigramas), dtype=str),
+            'offsets': self._offsets,
+            'postings': self._postings,
+            'tamanos': self._tamanos,
+            'municipios': self._municipios,
+        }
+
+    def search(self, nombre):
+        """
+        Puntúa todas las entradas frente a un nombre.
+        Args:
+            nombre (str): Nombre a buscar.
+        Returns:
+            tuple: (posiciones de municipio, puntuaciones) de las entradas que comparten algún trigrama.
+        """
+        trigramas = _trigramas(nombre)
+        listas = [
+            self._postings[self._offsets[i]:self._offsets[i + 1]]
+            for i in (self._trigramas.get(t) for t in trigramas) if i is not None
+        ]
+        if not listas:
+            return np.empty(0, dtype=np.int32), np.empty(0)
+        compartidos = np.bincount(np.concatenate(listas), minlength=len(self._tamanos))
+        entradas = np.flatnonzero(compartidos)
+        puntuaciones = 2 * compartidos[entradas] / (len(trigramas) + self._tamanos[entradas])
+        return self._municipios[entradas], puntuaciones
+
+
+class MunicipalityRegistry:
+    """
+    Registro de municipios de AEMET construido una sola vez a partir del CSV.
+    Guarda los datos en arrays y permite buscar por código o por nombre sin recorrer el DataFrame.
+    """
+
+    def __init__(self, codigos, nombres, capitales, latitudes, longitudes, num_hab, trigramas=None):
+        self.codigos = codigos
+        self.nombres = nombres
+        self.capitales = capitales
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.num_hab = num_hab
+        self._por_codigo = {int(codigo): i for i, codigo in enumerate(codigos)}
+        # Hay nombres repetidos en provincias distintas (Torrent, Mieres, Sada...): se guardan todos
+        self._por_nombre = defaultdict(list)
+        for i, nombre in enumerate(nombres):
+            self._por_nombre[nombre.lower()].append(i)
+        self._trigramas = trigramas if trigramas is not None else self._indexar_nombres()
+
+    def _indexar_nombres(self):
+        """Construye el índice de trigramas con el nombre, la capital y sus partes de cada municipio"""
+        variantes, posiciones = [], []
+        for i, nombre in enumerate(self.nombres):
+            formas = {nombre, self.capitales[i]}
+            for forma in list(formas):
+                formas.update(parte for parte in SEPARADORES_NOMBRE.split(forma) if len(parte) >= 4)
+            variantes.extend(formas)
+            posiciones.extend([i] * len(formas))
+        return TrigramIndex.build(variantes, posiciones)
+
+    @classmethod
+    def from_csv(cls, ruta=MUNICIPIOS_FILE):
+        """
+        Construye el registro a partir del CSV de municipios de AEMET.
+        Args:
+            ruta (str): Ruta del CSV.
+        Returns:
+            MunicipalityRegistry: Registro de municipios.
+        """
+        municipios = pd.read_csv(ruta)
+        codigos = municipios['id'].astype(str).str.removeprefix('id').astype(np.int32).to_numpy()
+
+        # Las coordenadas se calculan desde las columnas DMS; si alguna no se puede
+        # interpretar se usa la columna decimal del CSV
+        latitudes = parse_dms(municipios['latitud'])
+        longitudes = parse_dms(municipios['longitud'])
+        sin_latitud, sin_longitud = np.isnan(latitudes), np.isnan(longitudes)
+        if sin_latitud.any() or sin_longitud.any():
+            logger.warning(f"{int((sin_latitud | sin_longitud).sum())} municipios con coordenadas DMS no válidas")
+            latitudes[sin_latitud] = municipios['latitud_dec'].to_numpy()[sin_latitud]
+            longitudes[sin_longitud] = municipios['longitud_dec'].to_numpy()[sin_longitud]
+
+        return cls(
+            codigos,
+            municipios['nombre'].astype(str).tolist(),
+            municipios['capital'].fillna(municipios['nombre']).astype(str).to_numpy(dtype=object),
+            latitudes.astype(np.float32),
+            longitudes.astype(np.float32),
+            municipios['num_hab'].to_numpy(dtype=np.int32),
+        )
+
+    def save(self, version, directorio=SNAPSHOTS_DIR):
+        """Guarda el registro y su índice de trigramas como instantánea"""
+        arrays = {
+            'codigos': self.codigos,
+            'nombres': np.array(self.nombres, dtype=str),
+            'capitales': np.array(self.capitales, dtype=str),
+            'latitudes': self.latitudes,
+            'longitudes': self.longitudes,
+            'num_hab': self.num_hab,
+        }
+        arrays.update({f"trigramas_{clave}": array for clave, array in self._trigramas.to_arrays().items()})
+        save_snapshot('municipios', version, arrays, directorio)
+
+    @classmethod
+    def load(cls, version, directorio=SNAPSHOTS_DIR):
+        """
+        Abre el registro desde su instantánea sin leer el CSV ni recalcular los trigramas.
+        Returns:
+            MunicipalityRegistry: Registro de municipios o None si no hay instantánea de esa versión.
+        """
+        arrays = load_snapshot('municipios', version, directorio)
+        if arrays is None:
+            return None
+        trigramas = TrigramIndex(
+            {trigrama: i for i, trigrama in enumerate(arrays['trigramas_trigramas'].tolist())},
+            arrays['trigramas_offsets'], arrays['trigramas_postings'],
+            arrays['trigramas_tamanos'], arrays['trigramas_municipios'],
+        )
+        return cls(
+            arrays['codigos'], arrays['nombres'].tolist(), arrays['capitales'].astype(object),
+            arrays['latitudes'], arrays['longitudes'], arrays['num_hab'], trigramas,
+        )
+
+    def __len__(self):
+        return len(self.codigos)
+
+    def record(self, indice):
+        """
+        Devuelve el municipio en una posición del registro.
+        Args:
+            indice (int): Posición del municipio.
+        Returns:
+            Municipio: Datos del municipio.
+        """
+        return Municipio(
+            int(self.codigos[indice]),
+            self.nombres[indice],
+            self.capitales[indice],
+            float(self.latitudes[indice]),
+            float(self.longitudes[indice]),
+            int(self.num_hab[indice]),
+        )
+
+    def by_code(self, codigo):
+        """
+        Busca un municipio por su código de AEMET.
+        Args:
+            codigo (int | str): Código con o sin el prefijo 'id'.
+        Returns:
+            Municipio: Datos del municipio o None si no existe.
+        """
+        if isinstance(codigo, str):
+            codigo = codigo.removeprefix('id')
+        indice = self._por_codigo.get(int(codigo))
+        return None if indice is None else self.record(indice)
+
+    def _distancias_km(self, lat, lon, indices):
+        """Distancia aproximada (equirectangular) en km de unas coordenadas a varios municipios"""
+        dlat = self.latitudes[indices] - np.float32(lat)
+        dlon = (self.longitudes[indices] - np.float32(lon)) * np.float32(np.cos(np.radians(lat)))
+        return np.sqrt(dlat ** 2 + dlon ** 2) * KM_POR_GRADO
+
+    def match_name(self, nombre, lat=None, lon=None):
+        """
+        Busca el municipio cuyo nombre o capital se parece más al nombre dado.
+        Primero se busca el nombre exacto (si se repite en varias provincias, el más cercano a las
+        coordenadas); si no está, se busca por parecido. Con coordenadas, solo se aceptan parecidos
+        a menos de DISTANCIA_MAXIMA_KM del usuario, porque un nombre parecido en otra provincia es
+        peor que el municipio más cercano.
+        Args:
+            nombre (str): Nombre devuelto por Google.
+            lat (float): Latitud del usuario (opcional).
+            lon (float): Longitud del usuario (opcional).
+        Returns:
+            Municipio: Datos del municipio o None si ninguno alcanza el umbral de similitud.
+        """
+        exactos = self._por_nombre.get(nombre.lower())
+        if exactos:
+            if len(exactos) > 1 and lat is not None and lon is not None:
+                return self.record(exactos[int(np.argmin(self._distancias_km(lat, lon, np.array(exactos))))])
+            return self.record(exactos[0])
+
+        posiciones, puntuaciones = self._trigramas.search(nombre)
+        if lat is not None and lon is not None and len(posiciones):
+            cercanos = self._distancias_km(lat, lon, posiciones) <= DISTANCIA_MAXIMA_KM
+            posiciones, puntuaciones = posiciones[cercanos], puntuaciones[cercanos]
+        if len(puntuaciones) == 0 or puntuaciones.max() < UMBRAL_SIMILITUD:
+            return None
+        mejores = np.unique(posiciones[puntuaciones >= puntuaciones.max() - MARGEN_DESEMPATE])
+        if len(mejores) > 1 and lat is not None and lon is not None:
+            return self.record(int(mejores[np.argmin(self._distancias_km(lat, lon, mejores))]))
+        # Sin coordenadas nos quedamos con la mejor puntuación
+        return self.record(int(posiciones[np.argmax(puntuaciones)]))
+
+    def nearest(self, lat, lon):
+        """
+        Devuelve el municipio más cercano a unas coordenadas.
+        Args:
+            lat (float): Latitud.
+            lon (float): Longitud.
+        Returns:
+            Municipio: Datos del municipio más cercano.
+        """
+        distancias = (self.latitudes - np.float32(lat)) ** 2 + (self.longitudes - np.float32(lon)) ** 2
+        return self.record(int(np.argmin(distancias)))
+
+
+def open_registry(ruta=MUNICIPIOS_FILE, directorio=SNAPSHOTS_DIR):
+    """
+    Abre el registro desde la instantánea que corresponde al CSV, construyéndolo si no existe.
+    Args:
+        ruta (str): Ruta del CSV de municipios.
+        directorio (str): Directorio de las instantáneas.
+    Returns:
+        MunicipalityRegistry: Registro de municipios.
+    """
+    version = snapshot_version(file_hash(ruta), FORMATO)
+    registro = MunicipalityRegistry.load(version, directorio)
+    if registro is None:
+        registro = MunicipalityRegistry.from_csv(ruta)
+        registro.save(version, directorio)
+    return registro
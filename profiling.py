@@ -0,0 +1,155 @@
+import cProfile
+import html
+import os
+import pstats
+import threading
+
+import requests
+
+import resilience
+
+# Profundidad máxima y peso mínimo (fracción del tiempo total) de los nodos del árbol de llamadas
+PROFUNDIDAD_MAXIMA = 8
+FRACCION_MINIMA = 0.01
+
+# Funciones (fichero, nombre) que cuentan como una petición HTTP
+FUNCIONES_HTTP = {
+    (requests.sessions.__file__, 'request'),
+    (resilience.__file__, 'hedged_get'),
+}
+
+# Ancho en caracteres de las barras del resumen tipo flame graph
+ANCHO_BARRA = 40
+
+
+def _modulo(funcion):
+    """Agrupa una función por librería (pandas, numpy, requests...) o por fichero propio"""
+    fichero = funcion[0].replace('\\', '/')
+    if '/site-packages/' in fichero:
+        return fichero.split('/site-packages/')[1].split('/')[0]
+    if fichero.startswith('~') or fichero.startswith('<'):
+        return 'builtins'
+    return os.path.basename(fichero)
+
+
+def _nombre(funcion):
+    """Nombre legible de una función del perfil"""
+    fichero, linea, nombre = funcion
+    if fichero.startswith('~'):
+        return nombre
+    return f"{os.path.basename(fichero)}:{linea}({nombre})"
+
+
+class RerunProfiler:
+    """
+    Perfilador determinista (cProfile) de una ejecución del script.
+    Solo se crea cuando app.debug está activado, de modo que sin depuración no añade ningún coste.
+    """
+
+    # Cada sesión de Streamlit ejecuta el script en su propio hilo, igual que cProfile perfila por hilo
+    _activo = threading.local()
+
+    def __init__(self):
+        self._perfil = cProfile.Profile()
+        self.stats = None
+
+    @classmethod
+    def running(cls):
+        """Indica si ya hay un perfil en curso en este hilo (no se pueden anidar)"""
+        return getattr(cls._activo, 'perfil', None) is not None
+
+    def __enter__(self):
+        RerunProfiler._activo.perfil = self
+        self._perfil.enable()
+        return self
+
+    def __exit__(self, *excepcion):
+        self._perfil.disable()
+        RerunProfiler._activo.perfil = None
+        self.stats = pstats.Stats(self._perfil).stats
+        return False
+
+    def _raiz(self):
+        """Función con mayor tiempo acumulado: la llamada perfilada"""
+        return max(self.stats, key=lambda f: self.stats[f][3])
+
+    def call_counts(self):
+        """
+        Cuenta las llamadas a pandas hechas desde fuera de pandas y las peticiones HTTP.
+        cProfile solo ve el hilo principal, así que las peticiones a AEMET (que se hacen en el grupo
+        de hilos de hedged_get) se cuentan por llamada a hedged_get, sin contar las de respaldo.
+        Returns:
+            dict: Número de llamadas a pandas y de peticiones HTTP.
+        """
+        llamadas_pandas = 0
+        peticiones_http = 0
+        for funcion, (_, llamadas, _, _, llamadores) in self.stats.items():
+            modulo = _modulo(funcion)
+            if modulo == 'pandas':
+                llamadas_pandas += sum(
+                    datos[1] for llamador, datos in llamadores.items()
+                    if _modulo(llamador) not in ('pandas', 'numpy', 'builtins')
+                )
+            elif (funcion[0], funcion[2]) in FUNCIONES_HTTP:
+                peticiones_http += llamadas
+        return {'pandas': llamadas_pandas, 'http': peticiones_http}
+
+    def total_time(self):
+        """Tiempo total (segundos) de la llamada perfilada"""
+        return self.stats[self._raiz()][3]
+
+    def _hijos(self):
+        """Invierte la relación de llamadores: para cada función, sus llamadas y su tiempo acumulado"""
+        hijos = {}
+        for funcion, (_, _, _, _, llamadores) in self.stats.items():
+            for llamador, (_, llamadas, _, acumulado) in llamadores.items():
+                hijos.setdefault(llamador, []).append((acumulado, llamadas, funcion))
+        for lista in hijos.values():
+            lista.sort(reverse=True)
+        return hijos
+
+    def call_tree_html(self):
+        """
+        Árbol de llamadas plegable (HTML con <details>) a partir de la llamada perfilada.
+        Returns:
+            str: HTML del árbol.
+        """
+        hijos = self._hijos()
+        raiz = self._raiz()
+        total = self.total_time() or 1e-9
+
+        def nodo(funcion, acumulado, llamadas, profundidad, visitadas):
+            etiqueta = html.escape(
+                f"{_nombre(funcion)} — {acumulado * 1000:.1f} ms ({acumulado / total:.0%}), {llamadas} llamadas"
+            )
+            descendientes = [
+                h for h in hijos.get(funcion, [])
+                if h[0] / total >= FRACCION_MINIMA and h[2] not in visitadas
+            ]
+            if not descendientes or profundidad >= PROFUNDIDAD_MAXIMA:
+                return f"<div style='margin-left:1rem'>{etiqueta}</div>"
+            contenido = ''.join(
+                nodo(h[2], h[0], h[1], profundidad + 1, visitadas | {funcion}) for h in descendientes
+            )
+            return (
+                f"<details style='margin-left:1rem' {'open' if profundidad < 2 else ''}>"
+                f"<summary>{etiqueta}</summary>{contenido}</details>"
+            )
+
+        return nodo(raiz, total, self.stats[raiz][1], 0, frozenset())
+
+    def flame_summary(self):
+        """
+        Resumen tipo flame graph: tiempo propio agrupado por librería o fichero, con barras proporcionales.
+        Returns:
+            list: Tuplas (módulo, milisegundos, barra) ordenadas de mayor a menor.
+        """
+        por_modulo = {}
+        for funcion, (_, _, propio, _, _) in self.stats.items():
+            por_modulo[_modulo(funcion)] = por_modulo.get(_modulo(funcion), 0) + propio
+        total = sum(por_modulo.values()) or 1e-9
+        return [
+            (modulo, tiempo * 1000, '█' * max(1, round(tiempo / total * ANCHO_BARRA)))
+            for modulo, tiempo in sorted(por_modulo.items(), key=lambda x: -x[1])
+            if tiempo / total >= FRACCION_MINIMA
+        ]
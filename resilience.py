@@ -0,0 +1,296 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+import numpy as np
+import requests
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Latencias recientes que se usan para calcular los percentiles
+VENTANA_LATENCIAS = 200
+
+# Muestras mínimas antes de fiarse del percentil observado
+MIN_MUESTRAS = 20
+
+
+class CircuitOpenError(Exception):
+    """El circuito está abierto y no se hacen llamadas al servicio"""
+
+
+class RateLimitExceeded(Exception):
+    """No quedan peticiones disponibles en la cuota de la API"""
+
+
+class PoolSaturated(Exception):
+    """Todos los hilos de peticiones están ocupados: la petición no llega a enviarse"""
+
+
+class CircuitBreaker:
+    """
+    Cortocircuito para un servicio externo.
+    Tras varios fallos seguidos deja de llamar al servicio durante un tiempo; pasado ese tiempo
+    permite una llamada de prueba que vuelve a cerrar el circuito si tiene éxito.
+    """
+
+    def __init__(self, umbral_fallos=5, tiempo_reinicio=60):
+        self.umbral_fallos = umbral_fallos
+        self.tiempo_reinicio = tiempo_reinicio
+        self.fallos = 0
+        self._abierto_desde = None
+        self._prueba_en_curso = False
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self):
+        """'closed', 'open' o 'half-open'"""
+        if self._abierto_desde is None:
+            return 'closed'
+        if time.monotonic() - self._abierto_desde >= self.tiempo_reinicio:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        """
+        Indica si se puede llamar al servicio.
+        Returns:
+            bool: True si el circuito está cerrado o si es la llamada de prueba tras el tiempo de reinicio.
+        """
+        with self._lock:
+            estado = self.estado
+            if estado == 'closed':
+                return True
+            if estado == 'half-open' and not self._prueba_en_curso:
+                self._prueba_en_curso = True
+                return True
+            return False
+
+    def record_success(self):
+        """Registra una llamada correcta y cierra el circuito"""
+        with self._lock:
+            self.fallos = 0
+            self._abierto_desde = None
+            self._prueba_en_curso = False
+
+    def release(self):
+        """Libera la llamada de prueba sin contarla como éxito ni como fallo"""
+        with self._lock:
+            self._prueba_en_curso = False
+
+    def record_failure(self):
+        """Registra una llamada fallida y abre el circuito si se alcanza el umbral"""
+        with self._lock:
+            self.fallos += 1
+            if self._prueba_en_curso or self.fallos >= self.umbral_fallos:
+                if self._abierto_desde is None or self._prueba_en_curso:
+                    logger.warning(f"Circuito abierto tras {self.fallos} fallos")
+                self._abierto_desde = time.monotonic()
+            self._prueba_en_curso = False
+
+
+class LatencyTracker:
+    """Ventana deslizante de latencias (en segundos) de un tipo de llamada"""
+
+    def __init__(self, ventana=VENTANA_LATENCIAS):
+        self._latencias = deque(maxlen=ventana)
+
+    def record(self, segundos):
+        """Añade una latencia observada"""
+        self._latencias.append(segundos)
+
+    def percentile(self, percentil, por_defecto):
+        """
+        Percentil de las latencias recientes.
+        Args:
+            percentil (float): Percentil entre 0 y 100.
+            por_defecto (float): Valor a devolver si todavía hay pocas muestras.
+        Returns:
+            float: Latencia en segundos.
+        """
+        if len(self._latencias) < MIN_MUESTRAS:
+            return por_defecto
+        return float(np.percentile(list(self._latencias), percentil))
+
+
+class TokenBucket:
+    """
+    Limitador de peticiones por cubo de fichas para una clave de API.
+    Las fichas se recargan a ritmo constante hasta la capacidad máxima (ráfaga permitida).
+    """
+
+    def __init__(self, por_minuto, rafaga):
+        self.tasa = por_minuto / 60
+        self.capacidad = rafaga
+        self._fichas = float(rafaga)
+        self._ultima_recarga = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config_api):
+        """
+        Crea el limitador con la sección rate_limit de una API en config.yaml.
+        Args:
+            config_api (dict): Sección de la API (p. ej. config['api']['aemet']).
+        Returns:
+            TokenBucket: Limitador configurado.
+        """
+        limite = config_api.get('rate_limit', {})
+        return cls(limite.get('requests_per_minute', 60), limite.get('burst', 10))
+
+    def acquire(self, timeout=0):
+        """
+        Toma una ficha, esperando como mucho timeout segundos a que se recargue.
+        Args:
+            timeout (float): Segundos máximos de espera.
+        Returns:
+            bool: True si se ha obtenido la ficha.
+        """
+        limite = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self._fichas = min(self.capacidad, self._fichas + (ahora - self._ultima_recarga) * self.tasa)
+                self._ultima_recarga = ahora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return True
+                espera = (1 - self._fichas) / self.tasa
+            if ahora + espera > limite:
+                return False
+            time.sleep(espera)
+
+
+class SingleFlight:
+    """
+    Agrupa las llamadas idénticas en curso: la primera hace la petición y el resto esperan
+    su resultado (o su excepción) en lugar de repetirla.
+    """
+
+    def __init__(self):
+        self._en_curso = {}
+        self._lock = threading.Lock()
+
+    def do(self, clave, funcion):
+        """
+        Ejecuta funcion una sola vez para todas las llamadas simultáneas con la misma clave.
+        Args:
+            clave (hashable): Identificador de la petición (p. ej. servicio y municipio).
+            funcion (callable): Función sin argumentos que hace la petición.
+        Returns:
+            Any: Resultado de la función.
+        """
+        with self._lock:
+            futura = self._en_curso.get(clave)
+            lider = futura is None
+            if lider:
+                futura = Future()
+                self._en_curso[clave] = futura
+        if not lider:
+            return futura.result()
+        try:
+            futura.set_result(funcion())
+        except BaseException as e:
+            futura.set_exception(e)
+        finally:
+            with self._lock:
+                del self._en_curso[clave]
+        return futura.result()
+
+
+class UpstreamPool:
+    """
+    Grupo de hilos para las peticiones a servicios externos que nunca encola.
+    Si no hay un hilo libre la petición se rechaza al momento: una petición encolada empezaría
+    con el presupuesto de latencia casi agotado y su timeout se contaría como fallo del servicio.
+    """
+
+    def __init__(self, hilos):
+        self.hilos = hilos
+        self._ejecutor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='upstream')
+        self._libres = threading.BoundedSemaphore(hilos)
+
+    def submit(self, funcion):
+        """
+        Ejecuta funcion en un hilo libre.
+        Returns:
+            Future: Resultado de la función.
+        Excepciones:
+            PoolSaturated si todos los hilos están ocupados.
+        """
+        if not self._libres.acquire(blocking=False):
+            raise PoolSaturated(f"Los {self.hilos} hilos de peticiones están ocupados")
+        futura = self._ejecutor.submit(funcion)
+        futura.add_done_callback(lambda _: self._libres.release())
+        return futura
+
+
+def hedged_get(ejecutor, url, presupuesto, latencias, percentil=95, permitir_respaldo=None, **kwargs):
+    """
+    GET con presupuesto de latencia y petición de respaldo.
+    Si la primera petición no ha respondido cuando se supera el percentil de latencia observado,
+    se lanza una segunda idéntica (si hay un hilo libre) y se usa la primera respuesta correcta.
+    Nunca se espera más que el presupuesto.
+    Args:
+        ejecutor (UpstreamPool): Hilos en los que se hacen las peticiones.
+        url (str): URL a consultar.
+        presupuesto (float): Tiempo máximo en segundos.
+        latencias (LatencyTracker): Latencias recientes de este tipo de llamada.
+        percentil (float): Percentil a partir del cual se lanza la petición de respaldo.
+        permitir_respaldo (callable): Se llama antes de lanzar el respaldo; si devuelve False no se lanza
+                                      (p. ej. para tomar una ficha de la cuota de la clave de API).
+        **kwargs: Argumentos adicionales para requests.get (p. ej. headers).
+    Returns:
+        requests.Response: Respuesta con código 200.
+    Excepciones:
+        PoolSaturated si no hay ningún hilo libre para la primera petición (no se ha enviado nada);
+        TimeoutError si ninguna petición responde a tiempo; la última excepción si todas fallan.
+    """
+    inicio = time.monotonic()
+    limite = inicio + presupuesto
+
+    def peticion():
+        restante = max(limite - time.monotonic(), 0.001)
+        respuesta = requests.get(url, timeout=restante, **kwargs)
+        respuesta.raise_for_status()
+        return respuesta
+
+    pendientes = {ejecutor.submit(peticion)}
+    espera_respaldo = min(latencias.percentile(percentil, presupuesto / 2), presupuesto)
+    respaldo_lanzado = False
+    ultimo_error = None
+    while pendientes:
+        if respaldo_lanzado:
+            restante = limite - time.monotonic()
+        else:
+            restante = inicio + espera_respaldo - time.monotonic()
+        terminadas, pendientes = wait(pendientes, timeout=max(restante, 0), return_when=FIRST_COMPLETED)
+        for futura in terminadas:
+            try:
+                respuesta = futura.result()
+            except Exception as e:
+                ultimo_error = e
+                continue
+            latencias.record(time.monotonic() - inicio)
+            return respuesta
+        if not respaldo_lanzado and time.monotonic() < limite:
+            # Primera petición lenta o fallida: lanzamos la de respaldo si se permite y hay un hilo libre
+            respaldo_lanzado = True
+            if permitir_respaldo is None or permitir_respaldo():
+                try:
+                    pendientes.add(ejecutor.submit(peticion))
+                except PoolSaturated:
+                    pass
+        elif time.monotonic() >= limite:
+            break
+    if ultimo_error is not None and not pendientes:
+        raise ultimo_error
+    raise TimeoutError(f"Sin respuesta en {presupuesto:.1f} s: {url}")
+
+
+def create_executor(hilos=8):
+    """Crea el grupo de hilos compartido para las peticiones con respaldo"""
+    return UpstreamPool(hilos)
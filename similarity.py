@@ -0,0 +1,208 @@
+import logging
+import zlib
+
+import numpy as np
+
+from catalog import open_catalog
+from keyword_index import TEXT_COLUMNS, open_keyword_index, tokenizar
+from snapshots import SNAPSHOTS_DIR, load_snapshot, save_snapshot, snapshot_version
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Dimensión del espacio de n-gramas con hashing
+HASH_DIM = 2 ** 12
+
+# Vecinos que se guardan por actividad
+TOP_K = 20
+
+# Candidatos máximos con los que se compara cada actividad. Se toman primero los de sus palabras
+# menos frecuentes; de la palabra con la que se supera el límite solo se toma una muestra, así que
+# el coste por actividad no crece con el catálogo y toda actividad con palabras indexadas tiene vecinos
+MAX_CANDIDATOS = 2_000
+
+# Versión del formato de la tabla: cambiarla si cambia el cálculo para invalidar las instantáneas
+FORMATO = 1
+
+
+def _ngramas(texto):
+    """Palabras y pares de palabras consecutivas del texto ya tokenizado"""
+    tokens = tokenizar(texto)
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def _vectorizar(catalog):
+    """
+    Calcula los vectores TF-IDF dispersos (con hashing de n-gramas) de todas las actividades.
+    Args:
+        catalog (PartitionedCatalog): Catálogo de actividades.
+    Returns:
+        tuple: Matriz en formato CSR (indptr, indices, valores) con los vectores normalizados
+               y la lista de palabras de cada actividad.
+    """
+    filas, columnas, palabras = [], [], []
+    for inicio, datos in catalog.iter_partitions(TEXT_COLUMNS):
+        textos = datos['Nombre_Tarea'].fillna('') + ' ' + datos['Descripcion'].fillna('')
+        for desplazamiento, texto in enumerate(textos):
+            ngramas = _ngramas(texto)
+            palabras.append(sorted({n for n in ngramas if ' ' not in n}))
+            filas.extend([inicio + desplazamiento] * len(ngramas))
+            columnas.extend(zlib.crc32(n.encode('utf-8')) % HASH_DIM for n in ngramas)
+
+    # Agrupar por (fila, columna) para obtener la frecuencia de cada n-grama en cada actividad
+    claves, frecuencias = np.unique(
+        np.asarray(filas, dtype=np.int64) * HASH_DIM + np.asarray(columnas, dtype=np.int64), return_counts=True
+    )
+    filas, indices = np.divmod(claves, HASH_DIM)
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(filas, minlength=catalog.total_filas))])
+
+    # TF sublineal e IDF suavizado
+    frecuencia_documental = np.bincount(indices, minlength=HASH_DIM)
+    idf = np.log((1 + catalog.total_filas) / (1 + frecuencia_documental)) + 1
+    valores = (np.log1p(frecuencias) * idf[indices]).astype(np.float32)
+    normas = np.sqrt(np.add.reduceat(valores ** 2, indptr[:-1])) if len(valores) else np.empty(0)
+    normas[np.diff(indptr) == 0] = 1
+    valores /= np.repeat(normas, np.diff(indptr)).astype(np.float32)
+    return (indptr, indices.astype(np.int32), valores), palabras
+
+
+def build_similarity_index(catalog, keyword_index, k=TOP_K):
+    """
+    Calcula los k vecinos más cercanos (similitud coseno) de cada actividad.
+    Solo se comparan hasta MAX_CANDIDATOS actividades que comparten alguna palabra, empezando
+    por las palabras más específicas y usando las listas del índice de palabras clave, así que
+    el coste crece con el tamaño del catálogo y no con su cuadrado.
+    Args:
+        catalog (PartitionedCatalog): Catálogo de actividades.
+        keyword_index (KeywordIndex): Índice de palabras clave del mismo catálogo.
+        k (int): Número de vecinos por actividad.
+    Returns:
+        SimilarityIndex: Tabla de vecinos (-1 donde hay menos de k candidatos).
+    """
+    (indptr, indices, valores), palabras = _vectorizar(catalog)
+    total = catalog.total_filas
+    k = min(k, total - 1)
+    vecinos = np.full((total, k), -1, dtype=np.int32)
+    similitudes = np.zeros((total, k), dtype=np.float16)
+    denso = np.zeros(HASH_DIM, dtype=np.float32)
+    rng = np.random.default_rng(0)
+
+    for fila in range(total):
+        listas = sorted(
+            (p for p in (keyword_index.postings(palabra) for palabra in palabras[fila]) if p is not None), key=len
+        )
+        seleccion, restantes = [], MAX_CANDIDATOS
+        for postings in listas:
+            # Cada lista incluye la propia actividad, que no cuenta como candidata
+            if len(postings) - 1 > restantes:
+                # Palabra demasiado frecuente para compararla entera: una muestra de sus actividades
+                postings = postings[rng.integers(len(postings), size=restantes + 1)]
+            seleccion.append(postings)
+            restantes -= len(postings) - 1
+            if restantes <= 0:
+                break
+        if not seleccion:
+            continue
+        candidatos = np.unique(np.concatenate(seleccion))
+        candidatos = candidatos[candidatos != fila]
+        if len(candidatos) == 0:
+            continue
+
+        # Producto escalar disperso de la fila con cada candidato
+        propios = slice(indptr[fila], indptr[fila + 1])
+        denso[indices[propios]] = valores[propios]
+        longitudes = indptr[candidatos + 1] - indptr[candidatos]
+        segmentos = np.repeat(np.arange(len(candidatos)), longitudes)
+        desplazamientos = np.arange(len(segmentos)) - np.repeat(np.cumsum(longitudes) - longitudes, longitudes)
+        posiciones = indptr[candidatos][segmentos] + desplazamientos
+        puntuaciones = np.bincount(
+            segmentos, weights=valores[posiciones] * denso[indices[posiciones]], minlength=len(candidatos)
+        )
+        denso[indices[propios]] = 0
+
+        cuantos = min(k, len(candidatos))
+        mejores = np.argpartition(-puntuaciones, cuantos - 1)[:cuantos]
+        mejores = mejores[np.argsort(-puntuaciones[mejores])]
+        vecinos[fila, :cuantos] = candidatos[mejores]
+        similitudes[fila, :cuantos] = puntuaciones[mejores]
+
+    logger.info(f"Tabla de vecinos: {total} actividades, {k} vecinos por actividad")
+    return SimilarityIndex(vecinos, similitudes)
+
+
+class SimilarityIndex:
+    """
+    Tabla precalculada con los vecinos más parecidos de cada actividad, ordenados por similitud.
+    """
+
+    def __init__(self, vecinos, similitudes):
+        self.vecinos = vecinos
+        self.similitudes = similitudes
+
+    def save(self, version, directorio=SNAPSHOTS_DIR):
+        """Guarda la tabla de vecinos como instantánea"""
+        save_snapshot('vecinos', version, {'vecinos': self.vecinos, 'similitudes': self.similitudes}, directorio)
+
+    @classmethod
+    def load(cls, version, directorio=SNAPSHOTS_DIR):
+        """
+        Abre la tabla de vecinos desde su instantánea, proyectada en memoria.
+        Returns:
+            SimilarityIndex: Tabla de vecinos o None si no hay instantánea de esa versión.
+        """
+        arrays = load_snapshot('vecinos', version, directorio)
+        if arrays is None:
+            return None
+        return cls(arrays['vecinos'], arrays['similitudes'])
+
+    def similar(self, catalog, id_global, incluir_exterior, tiempo_disponible, excluidas=None):
+        """
+        Devuelve la actividad más parecida que cumple los filtros de exclusión, clima y tiempo.
+        Args:
+            catalog (PartitionedCatalog): Catálogo del que se leen las filas.
+            id_global (int): Identificador global de la actividad actual.
+            incluir_exterior (bool): Si se incluyen actividades de exterior.
+            tiempo_disponible (int): Tiempo disponible en minutos.
+            excluidas (set): Nombres de tareas excluidas.
+        Returns:
+            pd.Series: Una fila con la tarea sugerida o None si ningún vecino cumple los filtros.
+        """
+        vecinos = self.vecinos[id_global]
+        vecinos = vecinos[vecinos >= 0]
+        mascara = catalog.tiempos[vecinos] <= tiempo_disponible
+        if not incluir_exterior:
+            mascara &= vecinos < catalog.limite_interior
+        for vecino in vecinos[mascara]:
+            tarea = catalog.get_row(vecino)
+            if not excluidas or tarea['Nombre_Tarea'] not in excluidas:
+                return tarea
+        return None
+
+
+def similarity_version(catalog):
+    """Versión de la instantánea de la tabla de vecinos que corresponde al catálogo"""
+    return snapshot_version(catalog.fuentes, FORMATO)
+
+
+def open_similarity_index(catalog, directorio=SNAPSHOTS_DIR):
+    """
+    Abre la tabla de vecinos si hay una instantánea del catálogo actual. No la calcula: eso se hace
+    fuera de la aplicación con `python similarity.py`.
+    Args:
+        catalog (PartitionedCatalog): Catálogo de actividades.
+        directorio (str): Directorio de las instantáneas.
+    Returns:
+        SimilarityIndex: Tabla de vecinos lista para consultar o None si no existe o está desfasada.
+    """
+    indice = SimilarityIndex.load(similarity_version(catalog), directorio)
+    if indice is None:
+        logger.warning("No hay tabla de vecinos del catálogo actual: ejecuta `python similarity.py`")
+        return None
+    return indice
+
+
+if __name__ == '__main__':
+    # Precalcular la tabla de vecinos fuera de la aplicación
+    catalogo = open_catalog('data/cleaned/home_activities.csv', 'data/cleaned/outdoor_activities.csv')
+    build_similarity_index(catalogo, open_keyword_index(catalogo)).save(similarity_version(catalogo))
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+
+import numpy as np
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Directorio donde se guardan las instantáneas de los índices
+SNAPSHOTS_DIR = "data/snapshots"
+
+# Bytes que se leen de una vez al calcular el hash de un fichero
+TAMANO_BLOQUE = 1 << 20
+
+# Hashes ya calculados, por ruta, con el tamaño y la fecha de modificación del fichero
+HASHES_FILE = "hashes.json"
+
+_lock_hashes = threading.Lock()
+
+
+def _leer_hashes(ruta_cache):
+    """Lee la caché de hashes (vacía si no existe o no se puede leer)"""
+    try:
+        with open(ruta_cache, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def file_hash(ruta, directorio=SNAPSHOTS_DIR):
+    """
+    Calcula el hash SHA-256 del contenido de un fichero.
+    El hash se guarda junto a las instantáneas con el tamaño y la fecha de modificación del fichero,
+    y solo se vuelve a leer el fichero entero cuando alguno de los dos cambia. La fecha solo evita
+    recalcular: lo que identifica al fichero sigue siendo el hash de su contenido.
+    Args:
+        ruta (str): Ruta del fichero.
+        directorio (str): Directorio de las instantáneas, donde se guarda la caché de hashes.
+    Returns:
+        str: Hash en hexadecimal.
+    """
+    estado = os.stat(ruta)
+    clave = os.path.abspath(ruta)
+    ruta_cache = os.path.join(directorio, HASHES_FILE)
+    with _lock_hashes:
+        guardado = _leer_hashes(ruta_cache).get(clave)
+    if guardado is not None and guardado[:2] == [estado.st_size, estado.st_mtime_ns]:
+        return guardado[2]
+
+    sha = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(TAMANO_BLOQUE), b''):
+            sha.update(bloque)
+    resultado = sha.hexdigest()
+
+    with _lock_hashes:
+        hashes = _leer_hashes(ruta_cache)
+        hashes[clave] = [estado.st_size, estado.st_mtime_ns, resultado]
+        os.makedirs(directorio, exist_ok=True)
+        # Se escribe en un temporal y se renombra para que otro proceso nunca lea la caché a medias
+        temporal = f"{ruta_cache}.tmp-{os.getpid()}"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(hashes, f)
+        os.replace(temporal, ruta_cache)
+    return resultado
+
+
+def snapshot_version(*partes):
+    """
+    Etiqueta de versión de una instantánea a partir de los hashes de sus fuentes y del formato.
+    Args:
+        *partes: Valores serializables en JSON (hashes de ficheros, versión del formato...).
+    Returns:
+        str: Etiqueta corta en hexadecimal.
+    """
+    return hashlib.sha256(json.dumps(partes, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def save_snapshot(nombre, version, arrays, directorio=SNAPSHOTS_DIR):
+    """
+    Guarda los arrays de un índice como ficheros .npy en un directorio propio de la versión.
+    Se escribe en un directorio temporal que se renombra al terminar, así que una instantánea
+    a medias nunca se carga; las versiones anteriores del mismo índice se borran.
+    Args:
+        nombre (str): Nombre del índice (p. ej. 'keywords').
+        version (str): Etiqueta de versión.
+        arrays (dict): Arrays a guardar por nombre.
+        directorio (str): Directorio de las instantáneas.
+    """
+    destino = os.path.join(directorio, f"{nombre}-{version}")
+    temporal = f"{destino}.tmp-{os.getpid()}"
+    os.makedirs(temporal, exist_ok=True)
+    for clave, array in arrays.items():
+        np.save(os.path.join(temporal, f"{clave}.npy"), np.asarray(array), allow_pickle=False)
+    try:
+        os.rename(temporal, destino)
+    except OSError:
+        # Otro proceso ha guardado la misma versión antes
+        shutil.rmtree(temporal, ignore_errors=True)
+    for entrada in os.listdir(directorio):
+        if entrada.startswith(f"{nombre}-") and entrada != f"{nombre}-{version}" and '.tmp-' not in entrada:
+            shutil.rmtree(os.path.join(directorio, entrada), ignore_errors=True)
+    logger.info(f"Instantánea guardada: {nombre} ({version})")
+
+
+def load_snapshot(nombre, version, directorio=SNAPSHOTS_DIR):
+    """
+    Abre los arrays de una instantánea proyectados en memoria (sin leerlos enteros).
+    Args:
+        nombre (str): Nombre del índice.
+        version (str): Etiqueta de versión esperada.
+        directorio (str): Directorio de las instantáneas.
+    Returns:
+        dict: Arrays por nombre o None si no hay instantánea de esa versión.
+    """
+    ruta = os.path.join(directorio, f"{nombre}-{version}")
+    if not os.path.isdir(ruta):
+        return None
+    return {
+        fichero[:-len('.npy')]: np.load(os.path.join(ruta, fichero), mmap_mode='r')
+        for fichero in os.listdir(ruta) if fichero.endswith('.npy')
+    }
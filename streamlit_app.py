@@ -1,7 +1,20 @@
 import streamlit as st
-import pandas as pd
 import requests
+import time
 from datetime import datetime
+from uuid import uuid4
+from bulk_weather import WeatherTable
+from catalog import open_catalog
+from config import load_config
+from events import EventLog
+from feedback import FeedbackSampler
+from keyword_index import open_keyword_index
+from municipalities import open_registry
+from profiling import RerunProfiler
+from resilience import RateLimitExceeded, SingleFlight, TokenBucket
+from similarity import open_similarity_index
+from suggestions import SuggestionEngine
+from weather import AemetClient
 
 # Configuración de la página
 st.set_page_config(
@@ -56,23 +69,140 @@ st.markdown("""
 google_api_key = st.secrets["GOOGLE_API_KEY"]
 aemet_api_key = st.secrets["AEMET_API_KEY"]
 
+# Cargar la configuración de la aplicación
+config = load_config()
+google_config = config.get('api', {}).get('google', {})
+
+# Modo de depuración: mensajes en la barra lateral y perfil de cada ejecución
+DEBUG = config.get('app', {}).get('debug', False)
+
 # Cargar los datasets
-@st.cache_data
-def load_data():
+@st.cache_resource
+def load_municipalities():
+    """
+    Abre el registro de municipios de AEMET desde su instantánea, construyéndolo desde el CSV si ha cambiado.
+    Returns:
+    MunicipalityRegistry: Registro con códigos, coordenadas y población de cada municipio
+    """
+    return open_registry('data/raw/municipios_aemet.csv')
+
+@st.cache_resource
+def load_catalog():
+    """
+    Abre el catálogo de actividades particionado en disco, creándolo desde los CSV si hace falta.
+    Returns:
+    PartitionedCatalog: Catálogo de actividades de interior y exterior
+    """
+    return open_catalog('data/cleaned/home_activities.csv', 'data/cleaned/outdoor_activities.csv')
+
+@st.cache_resource
+def load_keyword_index(_catalog):
+    """
+    Abre el índice de palabras clave sobre el nombre y la descripción de las actividades desde su instantánea.
+    Returns:
+    KeywordIndex: Índice invertido del catálogo
+    """
+    return open_keyword_index(_catalog)
+
+@st.cache_resource
+def load_similarity_index(_catalog):
+    """
+    Carga la tabla precalculada de actividades parecidas (se genera con `python similarity.py`).
+    Returns:
+    SimilarityIndex: Vecinos más cercanos de cada actividad, o None si no hay tabla del catálogo actual
+    """
+    return open_similarity_index(_catalog)
+
+@st.cache_resource
+def load_feedback_sampler(_catalog):
+    """
+    Crea el muestreador ponderado por las respuestas de los usuarios, compartido por todas las sesiones.
+    Returns:
+    FeedbackSampler: Muestreador de actividades
+    """
+    return FeedbackSampler(_catalog)
+
+@st.cache_resource
+def load_event_log():
+    """
+    Crea el registro de eventos que escribe en segundo plano en SQLite.
+    Returns:
+    EventLog: Registro de interacciones
+    """
+    return EventLog()
+
+@st.cache_resource
+def load_aemet_client():
+    """
+    Crea el cliente de AEMET compartido por todas las sesiones (cortocircuito, latencias y últimas predicciones).
+    Returns:
+    AemetClient: Cliente de la predicción diaria por municipio
+    """
+    return AemetClient.from_config(aemet_api_key, config)
+
+@st.cache_resource(ttl=config.get('cache', {}).get('weather_ttl', 1800))
+def load_weather_table():
+    """
+    Carga la tabla de veredictos de clima de todos los municipios (se genera con `python bulk_weather.py`).
+    Returns:
+    WeatherTable: Veredictos por municipio y bloque horario, o None si no existe
+    """
+    return WeatherTable.load()
+
+@st.cache_resource
+def load_upstream_guards():
+    """
+    Crea los mecanismos compartidos por todas las sesiones para proteger las APIs externas.
+    Returns:
+    upstream_requests (SingleFlight): Agrupador de peticiones idénticas en curso
+    google_limiter (TokenBucket): Limitador de cuota de la clave de Google
+    """
+    return SingleFlight(), TokenBucket.from_config(google_config)
+
+municipios = load_municipalities()
+catalog = load_catalog()
+keyword_index = load_keyword_index(catalog)
+similarity_index = load_similarity_index(catalog)
+feedback_sampler = load_feedback_sampler(catalog)
+event_log = load_event_log()
+aemet_client = load_aemet_client()
+weather_table = load_weather_table()
+upstream_requests, google_limiter = load_upstream_guards()
+
+def google_geocode(params, clave):
     """
-    Carga los datasets de actividades y municipios desde los archivos CSV.
+    Llama a la API de geocodificación de Google. Las llamadas simultáneas con la misma clave
+    comparten una única petición y todas pasan por el limitador de cuota de la clave de API.
+    Args:
+    params (str): Parámetros de la consulta (address=... o latlng=...).
+    clave (tuple): Identificador de la petición para agruparla con otras idénticas.
     Returns:
-    indoor_activities (pd.DataFrame): Dataset de actividades de interior
-    outdoor_activities (pd.DataFrame): Dataset de actividades de exterior
-    municipios_aemet (pd.DataFrame): Dataset de municipios de AEMET
+    requests.Response: Respuesta de Google.
+    """
+    timeout = google_config.get('timeout', 5000) / 1000
+
+    def peticion():
+        if not google_limiter.acquire(timeout=timeout):
+            raise RateLimitExceeded("Cuota de peticiones a Google agotada")
+        url = f"https://maps.googleapis.com/maps/api/geocode/json?{params}&key={google_api_key}"
+        return requests.get(url, timeout=timeout)
 
+    return upstream_requests.do(clave, peticion)
+
+def debug_write(mensaje):
+    """
+    Muestra un mensaje de depuración en la barra lateral solo si app.debug está activado
+    Args:
+    mensaje (str): Texto a mostrar
     """
-    indoor_activities = pd.read_csv('data/cleaned/home_activities.csv')
-    outdoor_activities = pd.read_csv('data/cleaned/outdoor_activities.csv')
-    municipios_aemet = pd.read_csv('data/raw/municipios_aemet.csv')
-    return indoor_activities, outdoor_activities, municipios_aemet
+    if DEBUG:
+        st.sidebar.write(mensaje)
 
-indoor_activities, outdoor_activities, municipios_aemet = load_data()
+# Sugerencias, clima y registro de eventos (los mismos caminos que reproduce memory_profile.py)
+suggestions = SuggestionEngine(
+    catalog, keyword_index, similarity_index, feedback_sampler, event_log, aemet_client,
+    weather_table, config, debug=debug_write, warn=st.warning
+)
 
 def get_user_location():
 
@@ -84,9 +214,9 @@ def get_user_location():
     Excepciones:
     Muestra un mensaje de error en la interfaz de usuario de Streamlit si ocurre una excepción durante la solicitud.
     """
-    url = f"https://maps.googleapis.com/maps/api/geocode/json?address=Cádiz,Spain&key={google_api_key}"
+    direccion = "Cádiz,Spain"
     try:
-        response = requests.get(url)
+        response = google_geocode(f"address={direccion}", ('google-geocode', direccion))
         location_data = response.json()
         if location_data['status'] == 'OK':
             location = location_data['results'][0]['geometry']['location']
@@ -97,19 +227,22 @@ def get_user_location():
 
 def obtener_municipio(latitud, longitud):
     """
-    Obtiene el nombre del municipio más cercano a las coordenadas dadas utilizando la API de Google Maps.
+    Obtiene el municipio de las coordenadas dadas utilizando la API de Google Maps.
     Args:
     latitud (float): Latitud de la ubicación.
     longitud (float): Longitud de la ubicación.
     Returns:
-    str: El nombre del municipio más cercano si la solicitud es exitosa.
+    int: El código de AEMET del municipio si la solicitud es exitosa (no el nombre, que puede
+         repetirse en varias provincias).
          None si ocurre un error durante la solicitud o si el municipio no se encuentra.
          Excepciones:
          Muestra un mensaje de error en la interfaz de usuario de Streamlit si ocurre una excepción durante la solicitud.
     """
-    url = f"https://maps.googleapis.com/maps/api/geocode/json?latlng={latitud},{longitud}&key={google_api_key}"
+    # Las peticiones de coordenadas dentro de la misma celda se agrupan
+    celda = google_config.get('coordinate_cell', 0.01)
+    clave = ('google-geocode', round(latitud / celda), round(longitud / celda))
     try:
-        response = requests.get(url)
+        response = google_geocode(f"latlng={latitud},{longitud}", clave)
         if response.status_code == 200:
             data = response.json()
             if len(data['results']) > 0:
@@ -121,47 +254,48 @@ def obtener_municipio(latitud, longitud):
                 for component in address_components:
                     if 'locality' in component['types']:
                         municipio_locality = component['long_name']
-                        # Verificar si el municipio está en el CSV
-                        if obtener_codigo_municipio(municipio_locality) is not None:
-                            return municipio_locality
+                        # Verificar si el municipio está en el CSV (admite nombres aproximados)
+                        codigo = obtener_codigo_municipio(municipio_locality, latitud, longitud)
+                        if codigo is not None:
+                            return codigo
 
                 # 2. Buscar en 'administrative_area_level_4' o superior
                 for result in data['results']:
                     for component in result['address_components']:
                         if 'locality' in component['types'] or 'administrative_area_level_4' in component['types']:
                             municipio_alternative = component['long_name']
-                            if obtener_codigo_municipio(municipio_alternative) is not None:
-                                return municipio_alternative
+                            codigo = obtener_codigo_municipio(municipio_alternative, latitud, longitud)
+                            if codigo is not None:
+                                return codigo
 
                 # 3. Intentar con 'administrative_area_level_3'
                 for result in data['results']:
                     for component in result['address_components']:
                         if 'administrative_area_level_3' in component['types']:
                             municipio_alternative = component['long_name']
-                            if obtener_codigo_municipio(municipio_alternative) is not None:
-                                return municipio_alternative
+                            codigo = obtener_codigo_municipio(municipio_alternative, latitud, longitud)
+                            if codigo is not None:
+                                return codigo
         return None
     except Exception as e:
         st.error(f"Error al obtener el municipio: {str(e)}")
         return None
 
-def obtener_codigo_municipio(municipio_nombre):
+def obtener_codigo_municipio(municipio_nombre, latitud=None, longitud=None):
     """
     Obtiene el código del municipio de AEMET a partir del nombre del municipio.
+    Si el nombre no coincide exactamente, se busca el más parecido entre los nombres y
+    capitales de AEMET que estén cerca de las coordenadas.
     Args:
     municipio_nombre (str): Nombre del municipio.
+    latitud (float): Latitud de la ubicación (opcional).
+    longitud (float): Longitud de la ubicación (opcional).
     Returns:
-    str: El código del municipio si se encuentra en el dataset de municipios de AEMET.
-         None si el municipio no se encuentra en el dataset.
-    """
-    municipio_fila = municipios_aemet[municipios_aemet['nombre'].str.lower() == municipio_nombre.lower()]
-    if not municipio_fila.empty:
-        codigo_completo = municipio_fila.iloc[0]['id']
-        # Si el código empieza con 'id', lo eliminamos
-        if codigo_completo.startswith('id'):
-            return codigo_completo[2:]
-        return codigo_completo
-    return None
+    int: El código del municipio si se encuentra en el registro de municipios de AEMET.
+         None si el municipio no se encuentra en el registro.
+    """
+    municipio = municipios.match_name(municipio_nombre, latitud, longitud)
+    return None if municipio is None else municipio.codigo
 
 def get_nearest_municipio(lat, lon):
     """
@@ -172,222 +306,15 @@ def get_nearest_municipio(lat, lon):
         lon (float): Longitud
         
     Returns:
-        dict: Datos del municipio incluyendo el código sin prefijo
+        Municipio: Datos del municipio (código, nombre, capital, coordenadas y población)
     """
     # Primero intentamos obtener el municipio por nombre
-    municipio_nombre = obtener_municipio(lat, lon)
-    if municipio_nombre:
-        codigo = obtener_codigo_municipio(municipio_nombre)
-        if codigo:
-            municipio_data = municipios_aemet[municipios_aemet['id'] == f"id{codigo}"].iloc[0].copy()
-            # Aseguramos que el código no tiene el prefijo 'id'
-            municipio_data['id'] = codigo
-            return municipio_data
-
-    # Si no funciona, usamos el método de distancia como fallback
-    municipios_aemet['distancia'] = ((municipios_aemet['latitud_dec'] - lat)**2 + 
-                                    (municipios_aemet['longitud_dec'] - lon)**2)**0.5
-    municipio_data = municipios_aemet.loc[municipios_aemet['distancia'].idxmin()].copy()
-    
-    # Aseguramos que el código no tiene el prefijo 'id'
-    if municipio_data['id'].startswith('id'):
-        municipio_data['id'] = municipio_data['id'][2:]
-    
-    return municipio_data
+    codigo = obtener_municipio(lat, lon)
+    if codigo is not None:
+        return municipios.by_code(codigo)
 
     # Si no funciona, usamos el método de distancia como fallback
-    municipios_aemet['distancia'] = ((municipios_aemet['latitud_dec'] - lat)**2 + 
-                                    (municipios_aemet['longitud_dec'] - lon)**2)**0.5
-    return municipios_aemet.loc[municipios_aemet['distancia'].idxmin()]
-
-def obtener_bloque_tiempo(hora_actual):
-    """
-    Obtiene el bloque de tiempo correspondiente a la hora actual
-    """
-    bloques = [
-        (0, 6),
-        (6, 12),
-        (12, 18),
-        (18, 24)
-    ]
-    for inicio, fin in bloques:
-        if inicio <= hora_actual < fin:
-            return f"{inicio:02d}-{fin:02d}"
-    return None
-
-def obtener_viento_por_bloque(prediccion_hoy, bloque):
-    """
-    Obtiene la velocidad del viento para un bloque de tiempo específico
-    """
-    for viento in prediccion_hoy['viento']:
-        if viento['periodo'] == bloque:
-            return viento.get('velocidad', 'Información no disponible')
-    return 'Información no disponible'
-
-def obtener_lluvia_por_bloque(prediccion_hoy, bloque):
-    """
-    Obtiene la probabilidad de lluvia para un bloque de tiempo específico
-    """
-    for precipitacion in prediccion_hoy['probPrecipitacion']:
-        if precipitacion['periodo'] == bloque:
-            return precipitacion.get('value', 'Información no disponible')
-    return 'Información no disponible'
-
-def get_weather(nearest_municipio):
-    """
-    Obtiene la información del clima para el municipio más cercano
-    Args:
-        nearest_municipio (dict): Datos del municipio más cercano
-    Returns:
-        str: 'good' si el tiempo es bueno para actividades al aire libre.
-             'bad' si el tiempo no es adecuado para actividades al aire libre.
-    """
-    municipio_id = nearest_municipio['id']
-    if municipio_id.startswith('id'):
-        municipio_id = municipio_id[2:]  # Eliminamos el "id" si existe
-        
-    url = f"https://opendata.aemet.es/opendata/api/prediccion/especifica/municipio/diaria/{municipio_id}"
-    headers = {
-        'api_key': aemet_api_key
-    }
-    
-    try:
-        # Primera llamada para obtener la URL de los datos
-        response = requests.get(url, headers=headers)
-        if response.status_code == 200:
-            data = response.json()
-            if 'datos' in data:
-                # Segunda llamada para obtener los datos del clima
-                datos_response = requests.get(data['datos'])
-                if datos_response.status_code == 200:
-                    clima_data = datos_response.json()
-                    
-                    # Obtener el primer día de predicción
-                    prediccion_hoy = clima_data[0]['prediccion']['dia'][0]
-                    
-                    # Obtener la hora actual y el bloque correspondiente
-                    hora_actual = datetime.now().hour
-                    bloque = obtener_bloque_tiempo(hora_actual)
-                    
-                    # Obtener probabilidad de lluvia y viento
-                    prob_lluvia = obtener_lluvia_por_bloque(prediccion_hoy, bloque)
-                    velocidad_viento = obtener_viento_por_bloque(prediccion_hoy, bloque)
-                    
-                    # Convertir a números si son strings
-                    try:
-                        prob_lluvia = float(prob_lluvia) if prob_lluvia != 'Información no disponible' else 0
-                        velocidad_viento = float(velocidad_viento) if velocidad_viento != 'Información no disponible' else 0
-                    except (ValueError, TypeError):
-                        return 'good'  # Si hay error en la conversión, asumimos buen tiempo
-                    
-                    # Para debugging
-                    st.sidebar.write(f"Prob. lluvia: {prob_lluvia}%")
-                    st.sidebar.write(f"Vel. viento: {velocidad_viento} km/h")
-                    
-                    # Determinar si el tiempo es bueno basado en los criterios
-                    if prob_lluvia > 30 or velocidad_viento > 50:
-                        return 'bad'
-                    return 'good'
-                    
-        return 'good'  # Si hay algún error en las llamadas, asumimos buen tiempo
-    except Exception as e:
-        st.warning("No se pudo obtener información del clima. Asumiendo buen tiempo.")
-        return 'good'
-
-def suggest_task(is_good_weather, available_time, excluded_tasks=None):
-    """
-    Sugiere una tarea basada en el clima y el tiempo disponible
-    Args:
-        is_good_weather (bool): Indica si el clima es bueno para actividades al aire libre.
-        available_time (int): Tiempo disponible en minutos.
-        excluded_tasks (set): Conjunto de tareas excluidas.
-    Returns:
-        pd.Series: Una fila de un DataFrame con la tarea sugerida
-    """
-    if is_good_weather:
-        all_activities = pd.concat([indoor_activities, outdoor_activities])
-        st.sidebar.write("🎯 Buscando en actividades de interior y exterior")
-    else:
-        all_activities = indoor_activities
-        st.sidebar.write("🏠 Buscando solo en actividades de interior")
-        
-    filtered_activities = all_activities[all_activities['Tiempo_Estimado_Minutos'] <= available_time]
-    
-    if excluded_tasks:
-        filtered_activities = filtered_activities[~filtered_activities['Nombre_Tarea'].isin(excluded_tasks)]
-    
-    if filtered_activities.empty:
-        return None
-        
-    selected_task = filtered_activities.sample(n=1).iloc[0]
-    st.sidebar.write(f"📍 Categoría seleccionada: {selected_task['Categoria_Principal']}")
-    return selected_task
-
-def suggest_similar_task(category, subcategory, available_time, is_good_weather, excluded_tasks=None):
-    """
-    Sugiere una tarea similar a la categoría y subcategoría dadas
-    Args:
-        category (str): Categoría principal de la tarea actual.
-        subcategory (str): Subcategoría de la tarea actual.
-        available_time (int): Tiempo disponible en minutos.
-        is_good_weather (bool): Indica si el clima es bueno para actividades al aire libre.
-        excluded_tasks (set): Conjunto de tareas excluidas.
-    Returns:
-        pd.Series: Una fila de un DataFrame con la tarea sugerida
-    """
-    if is_good_weather:
-        all_activities = pd.concat([indoor_activities, outdoor_activities])
-        st.sidebar.write("🎯 Buscando tarea similar en actividades de interior y exterior")
-    else:
-        all_activities = indoor_activities
-        st.sidebar.write("🏠 Buscando tarea similar solo en actividades de interior")
-        
-    filtered_activities = all_activities[
-        (all_activities['Categoria_Principal'] == category) &
-        (all_activities['Subcategoria'] != subcategory) &
-        (all_activities['Tiempo_Estimado_Minutos'] <= available_time)
-    ]
-    
-    if excluded_tasks:
-        filtered_activities = filtered_activities[~filtered_activities['Nombre_Tarea'].isin(excluded_tasks)]
-        
-    if not filtered_activities.empty:
-        selected_task = filtered_activities.sample(n=1).iloc[0]
-        st.sidebar.write(f"📍 Nueva subcategoría: {selected_task['Subcategoria']}")
-        return selected_task
-    return None
-
-def suggest_different_task(category, available_time, is_good_weather, excluded_tasks=None):
-    """
-    Sugiere una tarea diferente a la categoría dada
-    Args:
-        category (str): Categoría principal de la tarea actual.
-        available_time (int): Tiempo disponible en minutos.
-        is_good_weather (bool): Indica si el clima es bueno para actividades al aire libre.
-        excluded_tasks (set): Conjunto de tareas excluidas.
-    Returns:
-        pd.Series: Una fila de un DataFrame con la tarea sugerida
-    """
-    if is_good_weather:
-        all_activities = pd.concat([indoor_activities, outdoor_activities])
-        st.sidebar.write("🎯 Buscando tarea diferente en actividades de interior y exterior")
-    else:
-        all_activities = indoor_activities
-        st.sidebar.write("🏠 Buscando tarea diferente solo en actividades de interior")
-        
-    filtered_activities = all_activities[
-        (all_activities['Categoria_Principal'] != category) &
-        (all_activities['Tiempo_Estimado_Minutos'] <= available_time)
-    ]
-    
-    if excluded_tasks:
-        filtered_activities = filtered_activities[~filtered_activities['Nombre_Tarea'].isin(excluded_tasks)]
-        
-    if not filtered_activities.empty:
-        selected_task = filtered_activities.sample(n=1).iloc[0]
-        st.sidebar.write(f"📍 Nueva categoría: {selected_task['Categoria_Principal']}")
-        return selected_task
-    return None
+    return municipios.nearest(lat, lon)
 
 def display_task_card(task):
     """
@@ -403,33 +330,63 @@ def display_task_card(task):
     </div>
     """, unsafe_allow_html=True)
 
-def main():
+def display_profile(profiler, container=None):
+    """
+    Muestra el perfil de la última ejecución: llamadas a pandas y HTTP, árbol de llamadas y resumen por módulo
+    Args:
+        profiler (RerunProfiler): Perfil de la ejecución de main() o del fragmento
+        container: Dónde se muestra (por defecto, la barra lateral; un fragmento solo puede escribir en su zona)
+    """
+    llamadas = profiler.call_counts()
+    with (container or st.sidebar).expander("🔬 Perfil de esta ejecución"):
+        st.write(f"⏱️ Tiempo total: {profiler.total_time() * 1000:.0f} ms")
+        st.write(f"🐼 Llamadas a pandas: {llamadas['pandas']}")
+        st.write(f"🌐 Peticiones HTTP: {llamadas['http']}")
+        st.markdown("**Tiempo propio por módulo**")
+        st.code('\n'.join(
+            f"{modulo:<20} {barra} {milisegundos:.1f} ms"
+            for modulo, milisegundos, barra in profiler.flame_summary()
+        ), language=None)
+        st.markdown("**Árbol de llamadas**")
+        st.markdown(profiler.call_tree_html(), unsafe_allow_html=True)
+
+@st.fragment
+def suggestion_panel(is_good_weather, municipio, weather):
    """
-   Función principal para la aplicación de Streamlit
+   Tiempo disponible, búsqueda, sugerencia, botones y recursos.
+   Es un fragmento: al mover el slider o pulsar un botón solo se vuelve a ejecutar esta parte
+   de la página, no la ubicación, el clima ni el resto de main()
+   Args:
+       is_good_weather (bool): Indica si el clima es bueno para actividades al aire libre.
+       municipio (str): Municipio del usuario.
+       weather (str): Veredicto del clima ('good', 'bad' o 'unknown').
+   """
+   if not DEBUG:
+       show_suggestions(is_good_weather, municipio, weather)
+       return
+
+   # Un fragmento solo puede escribir en su propia zona: los mensajes de depuración de las
+   # sugerencias se muestran aquí y no en la barra lateral
+   suggestions.debug = st.expander("🐞 Depuración de las sugerencias").write
+   try:
+       if RerunProfiler.running():
+           show_suggestions(is_good_weather, municipio, weather)
+       else:
+           # Rerun solo del fragmento: main() no se ejecuta, así que el perfil se hace aquí
+           with RerunProfiler() as profiler:
+               show_suggestions(is_good_weather, municipio, weather)
+           display_profile(profiler, st)
+   finally:
+       suggestions.debug = debug_write
+
+def show_suggestions(is_good_weather, municipio, weather):
+   """
+   Contenido de suggestion_panel
+   Args:
+       is_good_weather (bool): Indica si el clima es bueno para actividades al aire libre.
+       municipio (str): Municipio del usuario.
+       weather (str): Veredicto del clima ('good', 'bad' o 'unknown').
    """
-   # Header con estilo
-   st.markdown('# 🎯 Bored no more\n ## ¡Encuentra algo divertido que hacer en tu tiempo libre!')
-   
-   # Inicializar el estado del clima como 'good' por defecto
-   weather = 'good'
-   
-   # Sidebar con información del tiempo y ubicación
-   with st.sidebar:
-       st.markdown("### 📍 Tu ubicación")
-       user_lat, user_lon = get_user_location()
-       if user_lat and user_lon:
-           nearest_municipio = get_nearest_municipio(user_lat, user_lon)
-           st.info(f"📌 {nearest_municipio['nombre']}")
-           
-           # Mostrar el tiempo actual
-           weather = get_weather(nearest_municipio)
-           weather_icon = "🌞" if weather == 'good' else "🌧"
-           st.markdown(f"### {weather_icon} Tiempo actual")
-           st.write("Perfecto para actividades al aire libre" if weather == 'good' else "Mejor quedarse en interior")
-
-   # Definir is_good_weather aquí, después de obtener weather
-   is_good_weather = weather == 'good'
-   
    # Contenido principal
    col1, col2 = st.columns([2, 1])
    
@@ -442,16 +399,27 @@ def main():
        # Modifica la línea del slider así
        available_time = st.slider("", 10, 240, 60, help="Arrastra para seleccionar los minutos disponibles", key='time_slider')
 
+       # Búsqueda opcional por palabras clave
+       if 'last_query' not in st.session_state:
+           st.session_state.last_query = ''
+       query = st.text_input("🔎 ¿Te apetece algo en concreto?", placeholder="Por ejemplo: música o kayak", key='query_input')
+
        # Después del slider, añade esto
-       if st.session_state.last_time != available_time:
+       if st.session_state.last_time != available_time or st.session_state.last_query != query:
            # Inicializar excluded_tasks si no existe
            if 'excluded_tasks' not in st.session_state:
                st.session_state.excluded_tasks = set()
                
-           st.session_state.current_task = suggest_task(is_good_weather, available_time, st.session_state.excluded_tasks)
-           if st.session_state.current_task is not None:
-               st.session_state.excluded_tasks.add(st.session_state.current_task['Nombre_Tarea'])
+           new_task = suggestions.suggest_task(is_good_weather, available_time, st.session_state.excluded_tasks, query)
+           suggestions.log_event('suggestion', st.session_state.session_id, new_task, municipio, weather)
+           # Si no hay ninguna actividad nueva se mantiene la sugerencia anterior
+           if new_task is not None:
+               st.session_state.current_task = new_task
+               st.session_state.excluded_tasks.add(new_task['Nombre_Tarea'])
+           elif query:
+               st.warning("No encontramos actividades con esas palabras para el tiempo disponible.")
            st.session_state.last_time = available_time
+           st.session_state.last_query = query
        
        # Mostrar el tiempo seleccionado de forma más visual
        hours = available_time // 60
@@ -474,7 +442,8 @@ def main():
 
    # Obtener la tarea inicial si no existe
    if 'current_task' not in st.session_state:
-       st.session_state.current_task = suggest_task(is_good_weather, available_time)
+       st.session_state.current_task = suggestions.suggest_task(is_good_weather, available_time, query=query)
+       suggestions.log_event('suggestion', st.session_state.session_id, st.session_state.current_task, municipio, weather)
        if st.session_state.current_task is not None:
            st.session_state.excluded_tasks.add(st.session_state.current_task['Nombre_Tarea'])
 
@@ -487,8 +456,12 @@ def main():
    # Botones de acción
    with button_container:
        col1, col2, col3 = st.columns(3)
+       # Sin sugerencia actual los botones no tienen ninguna tarea sobre la que actuar
+       no_task = st.session_state.current_task is None
        
-       if col1.button('✅ ¡Voy a hacerlo!'):
+       if col1.button('✅ ¡Voy a hacerlo!', disabled=no_task):
+           feedback_sampler.record(st.session_state.current_task['ID_Global'], aceptada=True)
+           suggestions.log_event('accept', st.session_state.session_id, st.session_state.current_task, municipio, weather)
            with places_container:
                # Construir la URL de búsqueda de Google
                query = f"{st.session_state.current_task['Nombre_Tarea']} cómo hacer tutorial"
@@ -505,14 +478,17 @@ def main():
                </div>
                """, unsafe_allow_html=True)
 
-       if col2.button('🤔 Algo similar...'):
-           similar_task = suggest_similar_task(
+       if col2.button('🤔 Algo similar...', disabled=no_task):
+           feedback_sampler.record(st.session_state.current_task['ID_Global'], aceptada=False)
+           similar_task = suggestions.suggest_similar_task(
                st.session_state.current_task['Categoria_Principal'],
                st.session_state.current_task['Subcategoria'],
                available_time,
                is_good_weather,
-               st.session_state.excluded_tasks
+               st.session_state.excluded_tasks,
+               st.session_state.current_task['ID_Global']
            )
+           suggestions.log_event('similar', st.session_state.session_id, similar_task, municipio, weather)
            if similar_task is not None:
                st.session_state.current_task = similar_task
                st.session_state.excluded_tasks.add(similar_task['Nombre_Tarea'])
@@ -522,13 +498,15 @@ def main():
            else:
                st.warning("No encontramos actividades similares para el tiempo disponible.")
 
-       if col3.button('❌ Algo diferente'):
-           different_task = suggest_different_task(
+       if col3.button('❌ Algo diferente', disabled=no_task):
+           feedback_sampler.record(st.session_state.current_task['ID_Global'], aceptada=False)
+           different_task = suggestions.suggest_different_task(
                st.session_state.current_task['Categoria_Principal'],
                available_time,
                is_good_weather,
                st.session_state.excluded_tasks
            )
+           suggestions.log_event('different', st.session_state.session_id, different_task, municipio, weather)
            if different_task is not None:
                st.session_state.current_task = different_task
                st.session_state.excluded_tasks.add(different_task['Nombre_Tarea'])
@@ -538,9 +516,72 @@ def main():
            else:
                st.warning("No encontramos actividades diferentes para el tiempo disponible.")
 
+def main():
+   """
+   Función principal para la aplicación de Streamlit
+   """
+   # Header con estilo
+   st.markdown('# 🎯 Bored no more\n ## ¡Encuentra algo divertido que hacer en tu tiempo libre!')
+   
+   # Inicializar el estado del clima como 'good' por defecto
+   weather = 'good'
+   municipio = None
+
+   # Identificador de la sesión para el registro de eventos
+   if 'session_id' not in st.session_state:
+       st.session_state.session_id = uuid4().hex
+   
+   # Sidebar con información del tiempo y ubicación
+   with st.sidebar:
+       st.markdown("### 📍 Tu ubicación")
+       # La ubicación y el tiempo se guardan en la sesión para no repetirlos en cada rerun
+       if st.session_state.get('nearest_municipio') is None:
+           user_lat, user_lon = get_user_location()
+           if user_lat and user_lon:
+               st.session_state.nearest_municipio = get_nearest_municipio(user_lat, user_lon)
+       nearest_municipio = st.session_state.get('nearest_municipio')
+       if nearest_municipio is not None:
+           municipio = nearest_municipio.nombre
+           st.info(f"📌 {municipio}")
+           
+           # Mostrar el tiempo actual (se vuelve a consultar pasado cache.weather_ttl)
+           weather_ttl = config.get('cache', {}).get('weather_ttl', 1800)
+           if (st.session_state.get('weather', 'unknown') == 'unknown'
+                   or time.time() - st.session_state.weather_time > weather_ttl):
+               (st.session_state.weather, st.session_state.weather_stale,
+                st.session_state.weather_obtained) = suggestions.get_weather(nearest_municipio)
+               st.session_state.weather_time = time.time()
+           weather = st.session_state.weather
+           # El aviso se guarda con el veredicto para mostrarlo en todos los reruns, no solo al consultar
+           if st.session_state.weather_stale:
+               if st.session_state.weather_obtained is not None:
+                   hora = datetime.fromtimestamp(st.session_state.weather_obtained).strftime('%d/%m %H:%M')
+                   st.caption(f"⚠️ AEMET no responde: usamos la última predicción disponible ({hora})")
+               else:
+                   st.caption("⚠️ AEMET no responde: usamos la última clasificación disponible")
+           weather_icon = {'good': "🌞", 'bad': "🌧"}.get(weather, "❔")
+           st.markdown(f"### {weather_icon} Tiempo actual")
+           if weather == 'good':
+               st.write("Perfecto para actividades al aire libre")
+           elif weather == 'bad':
+               st.write("Mejor quedarse en interior")
+           else:
+               st.write("No sabemos qué tiempo hace: mejor quedarse en interior")
+
+   # Definir is_good_weather aquí, después de obtener weather
+   is_good_weather = weather == 'good'
+
+   suggestion_panel(is_good_weather, municipio, weather)
+
    # Footer
    st.markdown("---")
    st.markdown("Made with ❤️ using Streamlit")
 
 if __name__ == '__main__':
-   main()
\ No newline at end of file
+   if DEBUG:
+       # Sin depuración no se crea el perfilador, así que no hay ningún coste añadido
+       with RerunProfiler() as profiler:
+           main()
+       display_profile(profiler)
+   else:
+       main()
\ No newline at end of file
@@ -0,0 +1,268 @@
+from datetime import datetime
+
+# Valor de obtener_*_por_bloque cuando la predicción no trae el dato
+SIN_DATO = 'Información no disponible'
+
+# Aviso cuando AEMET responde pero su predicción no sirve para hoy
+AVISO_SIN_INTERPRETAR = "No se pudo interpretar la predicción del clima. Mostramos solo actividades de interior."
+
+
+def obtener_bloque_tiempo(hora_actual):
+    """
+    Obtiene el bloque de tiempo correspondiente a la hora actual
+    """
+    bloques = [
+        (0, 6),
+        (6, 12),
+        (12, 18),
+        (18, 24)
+    ]
+    for inicio, fin in bloques:
+        if inicio <= hora_actual < fin:
+            return f"{inicio:02d}-{fin:02d}"
+    return None
+
+
+def obtener_viento_por_bloque(prediccion_hoy, bloque):
+    """
+    Obtiene la velocidad del viento para un bloque de tiempo específico
+    """
+    for viento in prediccion_hoy['viento']:
+        if viento['periodo'] == bloque:
+            return viento.get('velocidad', SIN_DATO)
+    return SIN_DATO
+
+
+def obtener_lluvia_por_bloque(prediccion_hoy, bloque):
+    """
+    Obtiene la probabilidad de lluvia para un bloque de tiempo específico
+    """
+    for precipitacion in prediccion_hoy['probPrecipitacion']:
+        if precipitacion['periodo'] == bloque:
+            return precipitacion.get('value', SIN_DATO)
+    return SIN_DATO
+
+
+def obtener_prediccion_hoy(clima_data):
+    """
+    Obtiene la predicción del día actual. Si la predicción es antigua, el primer día
+    puede ser ya pasado, así que se busca el día por su fecha.
+    Devuelve None si la predicción no incluye el día de hoy
+    """
+    dias = clima_data[0]['prediccion']['dia']
+    hoy = datetime.now().strftime('%Y-%m-%d')
+    for dia in dias:
+        if str(dia.get('fecha', '')).startswith(hoy):
+            return dia
+    return None
+
+
+def _ignorar(mensaje):
+    """Destino por defecto de los mensajes de depuración y avisos (fuera de Streamlit no se muestran)"""
+
+
+class SuggestionEngine:
+    """
+    Caminos de sugerencias, clima y registro de eventos de la aplicación, sin interfaz.
+    Los usan streamlit_app.py y memory_profile.py con los mismos objetos compartidos; los mensajes
+    de depuración y los avisos al usuario salen por las funciones debug y warn.
+    """
+
+    def __init__(self, catalog, keyword_index, similarity_index, feedback_sampler, event_log,
+                 aemet_client, weather_table=None, config=None, debug=None, warn=None):
+        self.catalog = catalog
+        self.keyword_index = keyword_index
+        self.similarity_index = similarity_index
+        self.feedback_sampler = feedback_sampler
+        self.event_log = event_log
+        self.aemet_client = aemet_client
+        self.weather_table = weather_table
+        self.config = config or {}
+        self.weather_config = self.config.get('weather', {})
+        self.debug = debug or _ignorar
+        self.warn = warn or _ignorar
+
+    def get_weather(self, nearest_municipio):
+        """
+        Obtiene la información del clima para el municipio más cercano
+        Args:
+            nearest_municipio (Municipio): Datos del municipio más cercano
+        Returns:
+            tuple: (veredicto, antigua, obtenida)
+                veredicto (str): 'good' si el tiempo es bueno para actividades al aire libre.
+                                 'bad' si el tiempo no es adecuado para actividades al aire libre.
+                                 'unknown' si no hay datos de hoy que se puedan interpretar (ni de AEMET
+                                 ni de la tabla de veredictos).
+                antigua (bool): Si el veredicto sale de datos anteriores (AEMET no ha respondido o su
+                                respuesta no se puede usar).
+                obtenida (float): Momento en que se descargó la predicción antigua (None si no se conoce).
+        """
+        bloque = obtener_bloque_tiempo(datetime.now().hour)
+
+        # Si la tabla de todos los municipios tiene un veredicto reciente no llamamos a AEMET.
+        # Tiene su propia antigüedad máxima: recorrer todos los municipios lleva horas
+        if self.weather_table is not None:
+            veredicto = self.weather_table.verdict(
+                nearest_municipio.codigo, bloque, self.config.get('cache', {}).get('weather_table_ttl', 21600)
+            )
+            if veredicto is not None:
+                return veredicto, False, None
+
+        try:
+            prediccion = self.aemet_client.fetch(nearest_municipio.id)
+            if prediccion is None:
+                return self._sin_datos(
+                    nearest_municipio, bloque,
+                    "No se pudo obtener información del clima. Mostramos solo actividades de interior."
+                )
+            antigua = prediccion.antigua
+            obtenida = prediccion.obtenida if antigua else None
+
+            # Obtener el día de predicción actual; una predicción antigua puede no llegar a hoy
+            prediccion_hoy = obtener_prediccion_hoy(prediccion.datos)
+            if prediccion_hoy is None:
+                return self._sin_datos(nearest_municipio, bloque, AVISO_SIN_INTERPRETAR)
+
+            # Obtener probabilidad de lluvia y viento
+            prob_lluvia = obtener_lluvia_por_bloque(prediccion_hoy, bloque)
+            velocidad_viento = obtener_viento_por_bloque(prediccion_hoy, bloque)
+
+            # Convertir a números si son strings; como en bulk_weather, un dato que falta cuenta como 0,
+            # pero sin ningún dato (o con datos que no son números) no se adivina el tiempo
+            if prob_lluvia == SIN_DATO and velocidad_viento == SIN_DATO:
+                return self._sin_datos(nearest_municipio, bloque, AVISO_SIN_INTERPRETAR)
+            try:
+                prob_lluvia = float(prob_lluvia) if prob_lluvia != SIN_DATO else 0
+                velocidad_viento = float(velocidad_viento) if velocidad_viento != SIN_DATO else 0
+            except (ValueError, TypeError):
+                return self._sin_datos(nearest_municipio, bloque, AVISO_SIN_INTERPRETAR)
+
+            # Para debugging
+            self.debug(f"Prob. lluvia: {prob_lluvia}%")
+            self.debug(f"Vel. viento: {velocidad_viento} km/h")
+
+            # Determinar si el tiempo es bueno basado en los criterios
+            if (prob_lluvia > self.weather_config.get('rain_probability_threshold', 30)
+                    or velocidad_viento > self.weather_config.get('wind_speed_threshold', 50)):
+                return 'bad', antigua, obtenida
+            return 'good', antigua, obtenida
+        except Exception:
+            return self._sin_datos(nearest_municipio, bloque, AVISO_SIN_INTERPRETAR)
+
+    def _sin_datos(self, nearest_municipio, bloque, aviso):
+        """
+        Veredicto cuando AEMET no da datos de hoy que se puedan usar: la tabla de veredictos sirve
+        como dato antiguo aunque no sea reciente y, si tampoco está, el tiempo es desconocido
+        """
+        veredicto = None if self.weather_table is None else self.weather_table.verdict(
+            nearest_municipio.codigo, bloque
+        )
+        if veredicto is not None:
+            return veredicto, True, None
+        self.warn(aviso)
+        return 'unknown', False, None
+
+    def suggest_task(self, is_good_weather, available_time, excluded_tasks=None, query=None):
+        """
+        Sugiere una tarea basada en el clima y el tiempo disponible
+        Args:
+            is_good_weather (bool): Indica si el clima es bueno para actividades al aire libre.
+            available_time (int): Tiempo disponible en minutos.
+            excluded_tasks (set): Conjunto de tareas excluidas.
+            query (str): Palabras clave opcionales, p. ej. "música o kayak".
+        Returns:
+            pd.Series: Una fila de un DataFrame con la tarea sugerida
+        """
+        if is_good_weather:
+            self.debug("🎯 Buscando en actividades de interior y exterior")
+        else:
+            self.debug("🏠 Buscando solo en actividades de interior")
+
+        if query:
+            selected_task = self.keyword_index.sample(
+                self.catalog, query, is_good_weather, available_time, excluded_tasks
+            )
+        else:
+            selected_task = self.feedback_sampler.sample(is_good_weather, available_time, excluded_tasks)
+        if selected_task is None:
+            return None
+        self.debug(f"📍 Categoría seleccionada: {selected_task['Categoria_Principal']}")
+        return selected_task
+
+    def suggest_similar_task(self, category, subcategory, available_time, is_good_weather, excluded_tasks=None,
+                             task_id=None):
+        """
+        Sugiere una tarea similar a la tarea actual, usando la tabla de vecinos precalculada
+        y, si ningún vecino sirve, otra subcategoría de la misma categoría
+        Args:
+            category (str): Categoría principal de la tarea actual.
+            subcategory (str): Subcategoría de la tarea actual.
+            available_time (int): Tiempo disponible en minutos.
+            is_good_weather (bool): Indica si el clima es bueno para actividades al aire libre.
+            excluded_tasks (set): Conjunto de tareas excluidas.
+            task_id (int): Identificador global de la tarea actual.
+        Returns:
+            pd.Series: Una fila de un DataFrame con la tarea sugerida
+        """
+        if is_good_weather:
+            self.debug("🎯 Buscando tarea similar en actividades de interior y exterior")
+        else:
+            self.debug("🏠 Buscando tarea similar solo en actividades de interior")
+
+        selected_task = None
+        if task_id is not None and self.similarity_index is not None:
+            selected_task = self.similarity_index.similar(
+                self.catalog, task_id, is_good_weather, available_time, excluded_tasks
+            )
+        if selected_task is None:
+            selected_task = self.catalog.sample(
+                is_good_weather, available_time, excluded_tasks,
+                categoria=category, subcategoria_distinta=subcategory
+            )
+        if selected_task is not None:
+            self.debug(f"📍 Nueva subcategoría: {selected_task['Subcategoria']}")
+            return selected_task
+        return None
+
+    def suggest_different_task(self, category, available_time, is_good_weather, excluded_tasks=None):
+        """
+        Sugiere una tarea diferente a la categoría dada
+        Args:
+            category (str): Categoría principal de la tarea actual.
+            available_time (int): Tiempo disponible en minutos.
+            is_good_weather (bool): Indica si el clima es bueno para actividades al aire libre.
+            excluded_tasks (set): Conjunto de tareas excluidas.
+        Returns:
+            pd.Series: Una fila de un DataFrame con la tarea sugerida
+        """
+        if is_good_weather:
+            self.debug("🎯 Buscando tarea diferente en actividades de interior y exterior")
+        else:
+            self.debug("🏠 Buscando tarea diferente solo en actividades de interior")
+
+        selected_task = self.catalog.sample(
+            is_good_weather, available_time, excluded_tasks, categoria_distinta=category
+        )
+        if selected_task is not None:
+            self.debug(f"📍 Nueva categoría: {selected_task['Categoria_Principal']}")
+            return selected_task
+        return None
+
+    def log_event(self, event_type, session_id, task, municipio, weather):
+        """
+        Registra una interacción del usuario sin bloquear la petición
+        Args:
+            event_type (str): 'suggestion', 'similar', 'different' o 'accept'.
+            session_id (str): Identificador de la sesión del usuario.
+            task (pd.Series): Tarea sugerida o aceptada (None si no se encontró ninguna).
+            municipio (str): Nombre del municipio del usuario.
+            weather (str): Veredicto del clima.
+        """
+        self.event_log.record(
+            event_type,
+            session_id,
+            None if task is None else task['ID_Global'],
+            None if task is None else task['Nombre_Tarea'],
+            municipio,
+            weather
+        )
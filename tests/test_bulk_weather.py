@@ -0,0 +1,30 @@
+import time
+from datetime import datetime
+
+import numpy as np
+
+from bulk_weather import BLOQUES, WeatherTable, clasificar
+from config import load_config
+
+
+def _tabla(antiguedad):
+    """Tabla de hoy con un municipio descargado hace antiguedad segundos"""
+    lluvia = np.array([[10, 80, np.nan, 0]], dtype=np.float32)
+    viento = np.array([[5, 5, np.nan, 70]], dtype=np.float32)
+    return WeatherTable(
+        datetime.now().strftime('%Y-%m-%d'), np.array([11012]), clasificar(lluvia, viento),
+        lluvia.astype(np.float16), viento.astype(np.float16), np.array([time.time() - antiguedad]),
+    )
+
+
+def test_veredictos_por_bloque():
+    tabla = _tabla(0)
+    assert [tabla.verdict(11012, bloque) for bloque in BLOQUES] == ['good', 'bad', None, 'bad']
+    assert tabla.verdict(99999, BLOQUES[0]) is None
+
+
+def test_veredicto_de_una_descarga_masiva_completa_sigue_vigente():
+    # La descarga masiva tarda unas tres horas: el primer municipio ya tiene ~160 min al terminar
+    ttl = load_config()['cache']['weather_table_ttl']
+    assert _tabla(160 * 60).verdict(11012, BLOQUES[0], ttl) == 'good'
+    assert _tabla(ttl + 60).verdict(11012, BLOQUES[0], ttl) is None
@@ -0,0 +1,54 @@
+import os
+
+import pandas as pd
+import pytest
+
+import catalog
+from catalog import MANIFEST_FILE, open_catalog
+
+DATOS = os.path.join(os.path.dirname(__file__), '..', 'data', 'cleaned')
+
+
+@pytest.fixture
+def catalogo(tmp_path, monkeypatch):
+    """Catálogo pequeño con trozos de 7 filas para que las particiones tengan varios"""
+    monkeypatch.setattr(catalog, 'FILAS_POR_TROZO', 7)
+    rutas = []
+    for nombre in ('home_activities.csv', 'outdoor_activities.csv'):
+        ruta = tmp_path / nombre
+        pd.read_csv(os.path.join(DATOS, nombre)).head(300).to_csv(ruta, index=False)
+        rutas.append(str(ruta))
+    return open_catalog(*rutas, str(tmp_path / 'particiones'))
+
+
+def test_manifiesto_sin_temporales(catalogo):
+    assert os.listdir(catalogo.directorio).count(MANIFEST_FILE) == 1
+    assert not [f for f in os.listdir(catalogo.directorio) if '.tmp-' in f]
+
+
+def test_filas_por_id_global_en_todos_los_trozos(catalogo):
+    assert any(p['trozos'] > 1 for p in catalogo.particiones)
+    for id_global in range(catalogo.total_filas):
+        assert catalogo.get_row(id_global)['ID_Global'] == id_global
+
+
+def test_iter_partitions_recorre_todas_las_filas_en_orden(catalogo):
+    ids = [id_global for inicio, datos in catalogo.iter_partitions(['ID_Global'])
+           for id_global in datos['ID_Global']]
+    assert ids == list(range(catalogo.total_filas))
+    assert all(datos['ID_Global'].iloc[0] == inicio for inicio, datos in catalogo.iter_partitions())
+
+
+def test_sample_respeta_los_filtros(catalogo):
+    for _ in range(50):
+        tarea = catalogo.sample(False, 45)
+        assert tarea['ID_Global'] < catalogo.limite_interior
+        assert tarea['Tiempo_Estimado_Minutos'] <= 45
+
+
+def test_sample_con_casi_todo_excluido(catalogo):
+    interior = [catalogo.get_row(i) for i in range(catalogo.limite_interior)]
+    libre = interior[-1]
+    excluidas = {t['Nombre_Tarea'] for t in interior if t['Nombre_Tarea'] != libre['Nombre_Tarea']}
+    tarea = catalogo.sample(False, 10_000, excluidas)
+    assert tarea['Nombre_Tarea'] == libre['Nombre_Tarea']
@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+from municipalities import MunicipalityRegistry
+
+MUNICIPIOS_CSV = os.path.join(os.path.dirname(__file__), '..', 'data', 'raw', 'municipios_aemet.csv')
+
+
+@pytest.fixture(scope='module')
+def registro():
+    return MunicipalityRegistry.from_csv(MUNICIPIOS_CSV)
+
+
+def resolver(registro, nombre, lat, lon):
+    """Como get_nearest_municipio: nombre de Google y, si no se encuentra, el municipio más cercano"""
+    return registro.match_name(nombre, lat, lon) or registro.nearest(lat, lon)
+
+
+@pytest.mark.parametrize('nombre, lat, lon, codigo', [
+    # Nombres de Google que antes se confundían con municipios lejanos
+    ('Palma', 39.5696, 2.6502, 7040),
+    ('Santiago', 42.8782, -8.5448, 15078),
+    ('Ibiza', 38.9067, 1.4206, 7026),
+    ('Lérida', 41.6176, 0.6200, 25120),
+])
+def test_nombre_parecido_lejano_no_gana_al_mas_cercano(registro, nombre, lat, lon, codigo):
+    coincidencia = registro.match_name(nombre, lat, lon)
+    assert coincidencia is None or coincidencia.codigo == codigo
+    assert resolver(registro, nombre, lat, lon).codigo == codigo
+
+
+@pytest.mark.parametrize('nombre, lat, lon, codigo', [
+    ('Abadino', 43.1476, -2.6069, 48001),
+    ('San Sebastián', 43.3183, -1.9812, 20069),
+])
+def test_nombre_aproximado_cercano(registro, nombre, lat, lon, codigo):
+    assert registro.match_name(nombre, lat, lon).codigo == codigo
+
+
+def test_nombre_exacto(registro):
+    assert registro.match_name('cádiz').codigo == 11012
+
+
+@pytest.mark.parametrize('nombre, lat, lon, codigo', [
+    ('Torrent', 39.4371, -0.4650, 46244),
+    ('Torrent', 41.9520, 3.1271, 17197),
+    ('Mieres', 43.2536, -5.7780, 33037),
+    ('Sada', 42.5871, -1.3981, 31212),
+    ('Sada', 43.3550, -8.2569, 15075),
+])
+def test_nombre_repetido_el_mas_cercano(registro, nombre, lat, lon, codigo):
+    assert registro.match_name(nombre, lat, lon).codigo == codigo
+
+
+def test_todos_los_nombres_repetidos_con_sus_coordenadas(registro):
+    nombres = [nombre.lower() for nombre in registro.nombres]
+    repetidos = {nombre for nombre in nombres if nombres.count(nombre) > 1}
+    for i, nombre in enumerate(registro.nombres):
+        if nombre.lower() in repetidos:
+            municipio = registro.match_name(nombre, float(registro.latitudes[i]), float(registro.longitudes[i]))
+            assert municipio.codigo == int(registro.codigos[i]), nombre
@@ -0,0 +1,17 @@
+import threading
+
+from profiling import RerunProfiler
+
+
+def test_running_solo_dentro_del_perfil_y_por_hilo():
+    en_otro_hilo = []
+    assert not RerunProfiler.running()
+    with RerunProfiler() as profiler:
+        assert RerunProfiler.running()
+        hilo = threading.Thread(target=lambda: en_otro_hilo.append(RerunProfiler.running()))
+        hilo.start()
+        hilo.join()
+        sum(range(1000))
+    assert not RerunProfiler.running()
+    assert en_otro_hilo == [False]
+    assert profiler.total_time() >= 0
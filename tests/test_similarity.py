@@ -0,0 +1,37 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import similarity
+from catalog import open_catalog
+from keyword_index import KeywordIndex
+from similarity import build_similarity_index
+
+DATOS = os.path.join(os.path.dirname(__file__), '..', 'data', 'cleaned')
+
+
+@pytest.fixture(scope='module')
+def catalogo(tmp_path_factory):
+    directorio = tmp_path_factory.mktemp('catalogo')
+    rutas = []
+    for nombre in ('home_activities.csv', 'outdoor_activities.csv'):
+        ruta = directorio / nombre
+        pd.read_csv(os.path.join(DATOS, nombre)).head(200).to_csv(ruta, index=False)
+        rutas.append(str(ruta))
+    return open_catalog(*rutas, str(directorio / 'particiones'))
+
+
+def test_todas_las_actividades_tienen_vecinos_aunque_las_palabras_sean_frecuentes(catalogo, monkeypatch):
+    # Con un límite muy por debajo de la frecuencia de cualquier palabra, como en un catálogo enorme
+    monkeypatch.setattr(similarity, 'MAX_CANDIDATOS', 3)
+    indice = build_similarity_index(catalogo, KeywordIndex.build(catalogo))
+    assert (indice.vecinos[:, 0] >= 0).all()
+    assert (indice.vecinos[:, 0] != np.arange(catalogo.total_filas)).all()
+
+
+def test_el_vecino_mas_parecido_comparte_palabras(catalogo):
+    indice = build_similarity_index(catalogo, KeywordIndex.build(catalogo))
+    assert (indice.similitudes[:, 0] > 0).all()
+    assert (np.diff(indice.similitudes.astype(np.float32), axis=1) <= 1e-3).all()
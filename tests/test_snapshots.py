@@ -0,0 +1,26 @@
+import hashlib
+import os
+
+from snapshots import file_hash
+
+
+def test_file_hash_solo_recalcula_si_cambia_el_fichero(tmp_path, monkeypatch):
+    ruta = tmp_path / 'datos.csv'
+    ruta.write_bytes(b'a,b\n1,2\n')
+    directorio = str(tmp_path / 'snapshots')
+    esperado = hashlib.sha256(b'a,b\n1,2\n').hexdigest()
+    nuevo = hashlib.sha256(b'a,b\n3,4\n').hexdigest()
+    assert file_hash(str(ruta), directorio) == esperado
+
+    lecturas = []
+    sha256 = hashlib.sha256
+    monkeypatch.setattr('snapshots.hashlib.sha256', lambda: lecturas.append(ruta) or sha256())
+    assert file_hash(str(ruta), directorio) == esperado
+    assert lecturas == []
+
+    # Mismo tamaño pero otra fecha de modificación: se vuelve a leer
+    ruta.write_bytes(b'a,b\n3,4\n')
+    estado = os.stat(ruta)
+    os.utime(ruta, ns=(estado.st_atime_ns, estado.st_mtime_ns + 1_000_000_000))
+    assert file_hash(str(ruta), directorio) == nuevo
+    assert len(lecturas) == 1
@@ -0,0 +1,77 @@
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from bulk_weather import BLOQUES, WeatherTable, clasificar
+from municipalities import Municipio
+from suggestions import SuggestionEngine
+from weather import Prediccion
+
+CADIZ = Municipio(11012, 'Cádiz', 'Cádiz', 36.53, -6.29, 116_000)
+
+
+class _Aemet:
+    """Cliente de AEMET que devuelve siempre la misma predicción"""
+
+    def __init__(self, prediccion):
+        self.prediccion = prediccion
+
+    def fetch(self, municipio_id):
+        return self.prediccion
+
+
+def _prediccion(lluvia, viento, dias=0, antigua=False):
+    """Predicción con los mismos valores en todos los bloques, para el día de hoy desplazado dias"""
+    fecha = (datetime.now() + timedelta(days=dias)).strftime('%Y-%m-%dT00:00:00')
+    datos = [{'prediccion': {'dia': [{
+        'fecha': fecha,
+        'probPrecipitacion': [{'value': lluvia, 'periodo': b} for b in BLOQUES],
+        'viento': [{'velocidad': viento, 'periodo': b} for b in BLOQUES],
+    }]}}]
+    return Prediccion(datos, time.time() - 86_400 if antigua else time.time(), antigua)
+
+
+def _motor(prediccion, tabla=None):
+    avisos = []
+    motor = SuggestionEngine(
+        None, None, None, None, None, _Aemet(prediccion), tabla,
+        {'weather': {'rain_probability_threshold': 30, 'wind_speed_threshold': 50}}, warn=avisos.append
+    )
+    return motor, avisos
+
+
+def _tabla_mala():
+    """Tabla de hoy, descargada hace un día, con mal tiempo en Cádiz en todos los bloques"""
+    lluvia = np.full((1, len(BLOQUES)), 90, dtype=np.float32)
+    viento = np.zeros((1, len(BLOQUES)), dtype=np.float32)
+    return WeatherTable(
+        datetime.now().strftime('%Y-%m-%d'), np.array([11012]), clasificar(lluvia, viento),
+        lluvia, viento, np.array([time.time() - 86_400]),
+    )
+
+
+@pytest.mark.parametrize('lluvia, viento, veredicto', [(10, 5, 'good'), (80, 5, 'bad'), (10, 70, 'bad')])
+def test_umbrales(lluvia, viento, veredicto):
+    motor, avisos = _motor(_prediccion(lluvia, viento))
+    assert motor.get_weather(CADIZ) == (veredicto, False, None)
+    assert avisos == []
+
+
+@pytest.mark.parametrize('prediccion', [
+    _prediccion('n/d', 5),
+    _prediccion('', ''),
+    _prediccion(10, 5, dias=-2, antigua=True),
+    None,
+])
+def test_sin_datos_utiles_no_se_asume_buen_tiempo(prediccion):
+    motor, avisos = _motor(prediccion)
+    assert motor.get_weather(CADIZ) == ('unknown', False, None)
+    assert len(avisos) == 1
+
+
+def test_sin_datos_utiles_se_usa_la_tabla_como_dato_antiguo():
+    motor, avisos = _motor(_prediccion(10, 5, dias=-2, antigua=True), _tabla_mala())
+    assert motor.get_weather(CADIZ) == ('bad', True, None)
+    assert avisos == []
@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+
+from resilience import PoolSaturated, TokenBucket, UpstreamPool
+from weather import AemetClient
+
+
+@pytest.fixture
+def pool_ocupado():
+    """Grupo de un solo hilo bloqueado hasta terminar el test"""
+    pool = UpstreamPool(1)
+    liberar = threading.Event()
+    pool.submit(liberar.wait)
+    yield pool
+    liberar.set()
+
+
+def test_pool_saturado_rechaza_al_momento(pool_ocupado):
+    with pytest.raises(PoolSaturated):
+        pool_ocupado.submit(lambda: None)
+
+
+def test_pool_saturado_no_cuenta_como_fallo_de_aemet(pool_ocupado):
+    cliente = AemetClient('clave', failure_threshold=1)
+    cliente._ejecutor = pool_ocupado
+    assert cliente.fetch('11012') is None
+    assert cliente.breaker.fallos == 0
+    assert cliente.breaker.allow()
+
+
+def test_hilos_segun_la_cuota():
+    cliente = AemetClient('clave', timeout_ms=5000, limiter=TokenBucket(60, 10))
+    # 10 fichas de ráfaga más 5 recargadas durante el presupuesto, dos peticiones por descarga
+    assert cliente._ejecutor.hilos == 30
+
+
+class _Respuesta:
+    def __init__(self, datos):
+        self._datos = datos
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._datos
+
+
+@pytest.mark.parametrize('rafaga, llamadas_con_clave', [(1, 1), (2, 2)])
+def test_respaldo_con_clave_solo_con_ficha(monkeypatch, rafaga, llamadas_con_clave):
+    con_clave = []
+
+    def get_lento(url, timeout, headers=None):
+        if headers:
+            con_clave.append(url)
+            time.sleep(0.3)
+            return _Respuesta({'datos': 'https://datos'})
+        return _Respuesta([])
+
+    monkeypatch.setattr('resilience.requests.get', get_lento)
+    # Sin latencias registradas el respaldo sale a mitad del presupuesto (0,2 s)
+    cliente = AemetClient('clave', timeout_ms=400, limiter=TokenBucket(1, rafaga))
+    assert cliente.fetch('11012') is not None
+    assert len(con_clave) == llamadas_con_clave
+
+
+def test_rafaga_de_peticiones_iguales_hace_una_sola_llamada(monkeypatch):
+    llamadas = []
+
+    def get_lento(url, timeout, headers=None):
+        llamadas.append(url)
+        time.sleep(0.2)
+        return _Respuesta({'datos': 'https://datos'} if headers else [{'id': 11012}])
+
+    monkeypatch.setattr('resilience.requests.get', get_lento)
+    # El respaldo saldría a mitad del presupuesto (1 s), mucho después de la respuesta
+    cliente = AemetClient('clave', timeout_ms=2000)
+    hilos = 20
+    salida = threading.Barrier(hilos)
+    resultados = [None] * hilos
+
+    def pedir(i):
+        salida.wait()
+        resultados[i] = cliente.fetch('11012')
+
+    trabajadores = [threading.Thread(target=pedir, args=(i,)) for i in range(hilos)]
+    for trabajador in trabajadores:
+        trabajador.start()
+    for trabajador in trabajadores:
+        trabajador.join()
+
+    # Una llamada por paso (índice con la clave y datos), compartida por las 20 peticiones
+    assert len(llamadas) == 2
+    assert all(r is not None and r.datos == [{'id': 11012}] for r in resultados)
@@ -0,0 +1,132 @@
+import logging
+import math
+import threading
+import time
+from typing import Any, NamedTuple
+
+from resilience import (
+    CircuitBreaker, CircuitOpenError, LatencyTracker, PoolSaturated, RateLimitExceeded, SingleFlight,
+    TokenBucket, create_executor, hedged_get
+)
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+AEMET_BASE_URL = "https://opendata.aemet.es/opendata/api"
+
+
+class Prediccion(NamedTuple):
+    """Predicción diaria de AEMET para un municipio"""
+    datos: Any
+    obtenida: float
+    antigua: bool
+
+
+class AemetClient:
+    """
+    Cliente de la predicción diaria por municipio de AEMET (dos llamadas: la primera devuelve
+    la URL de 'datos' y la segunda la predicción).
+    Cada llamada tiene su propio presupuesto de latencia y petición de respaldo, un cortocircuito
+    deja de llamar a AEMET mientras falla y, si no hay respuesta, se sirve la última predicción
+    conocida del municipio marcada como antigua. Las peticiones simultáneas del mismo municipio
+    se agrupan en una sola y la clave de API tiene su propio limitador de cuota.
+    """
+
+    def __init__(self, api_key, base_url=AEMET_BASE_URL, timeout_ms=5000, hedge_percentile=95,
+                 failure_threshold=5, reset_timeout=60, limiter=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.presupuesto = timeout_ms / 1000
+        self.percentil = hedge_percentile
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.limiter = limiter or TokenBucket(50, 10)
+        self._en_curso = SingleFlight()
+        self._latencias_indice = LatencyTracker()
+        self._latencias_datos = LatencyTracker()
+        # Descargas que la cuota deja empezar dentro de un presupuesto, con dos peticiones
+        # (original y respaldo) cada una: con más hilos solo se esperaría a la cuota
+        descargas = math.ceil(self.limiter.capacidad + self.limiter.tasa * self.presupuesto)
+        self._ejecutor = create_executor(2 * descargas)
+        self._ultimas = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, api_key, config):
+        """
+        Crea el cliente con los parámetros de la sección api.aemet de config.yaml.
+        Args:
+            api_key (str): Clave de la API de AEMET.
+            config (dict): Configuración de la aplicación.
+        Returns:
+            AemetClient: Cliente configurado.
+        """
+        aemet = config.get('api', {}).get('aemet', {})
+        breaker = aemet.get('circuit_breaker', {})
+        return cls(
+            api_key,
+            base_url=aemet.get('base_url', AEMET_BASE_URL),
+            timeout_ms=aemet.get('timeout', 5000),
+            hedge_percentile=aemet.get('hedge_percentile', 95),
+            failure_threshold=breaker.get('failure_threshold', 5),
+            reset_timeout=breaker.get('reset_timeout', 60),
+            limiter=TokenBucket.from_config(aemet),
+        )
+
+    def _descargar(self, municipio_id, espera_cuota):
+        """Hace las dos llamadas a AEMET y devuelve la predicción en JSON"""
+        # Solo la primera llamada lleva la clave de API y cuenta para la cuota, también su respaldo:
+        # este solo se lanza si en ese momento queda una ficha libre
+        if not self.limiter.acquire(timeout=self.presupuesto if espera_cuota is None else espera_cuota):
+            raise RateLimitExceeded("Cuota de peticiones a AEMET agotada")
+        url = f"{self.base_url}/prediccion/especifica/municipio/diaria/{municipio_id}"
+        respuesta = hedged_get(
+            self._ejecutor, url, self.presupuesto, self._latencias_indice, self.percentil,
+            permitir_respaldo=lambda: self.limiter.acquire(0), headers={'api_key': self.api_key}
+        )
+        datos_url = respuesta.json().get('datos')
+        if not datos_url:
+            raise ValueError("No se encontró la clave 'datos' en la respuesta de AEMET")
+        respuesta = hedged_get(self._ejecutor, datos_url, self.presupuesto, self._latencias_datos, self.percentil)
+        return respuesta.json()
+
+    def _actualizar(self, municipio_id, espera_cuota, recordar):
+        """Descarga la predicción pasando por el cortocircuito y la guarda como última conocida"""
+        if not self.breaker.allow():
+            raise CircuitOpenError("AEMET no disponible temporalmente")
+        try:
+            datos = self._descargar(municipio_id, espera_cuota)
+        except (RateLimitExceeded, PoolSaturated):
+            # Agotar nuestra propia cuota o nuestros hilos no es un fallo de AEMET
+            self.breaker.release()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        prediccion = Prediccion(datos, time.time(), False)
+        if recordar:
+            with self._lock:
+                self._ultimas[municipio_id] = prediccion
+        return prediccion
+
+    def fetch(self, municipio_id, espera_cuota=None, recordar=True):
+        """
+        Obtiene la predicción diaria de un municipio.
+        Args:
+            municipio_id (str): Código de cinco cifras del municipio.
+            espera_cuota (float): Segundos máximos de espera a la cuota (por defecto, el presupuesto de latencia).
+            recordar (bool): Si se guarda como última predicción conocida (las descargas masivas no la guardan).
+        Returns:
+            Prediccion: Predicción actual o, si AEMET no responde, la última conocida con antigua=True.
+                        None si AEMET no responde y no hay ninguna predicción anterior.
+        """
+        try:
+            return self._en_curso.do(
+                ('aemet', municipio_id), lambda: self._actualizar(municipio_id, espera_cuota, recordar)
+            )
+        except Exception as e:
+            logger.error(f"Error al obtener la predicción de {municipio_id}: {str(e)}")
+            with self._lock:
+                ultima = self._ultimas.get(municipio_id)
+            return None if ultima is None else ultima._replace(antigua=True)